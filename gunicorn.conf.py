@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration.
+
+The app is imported once by the master process, which loads the data of
+the visualizations before forking the workers: the tables are shared
+memory-mapped files (see src/store.py), and the other objects are shared
+copy-on-write.
+
+This trades the immediate first layout of the app, served with
+placeholders while the data loads (see src/app.py), for memory: the
+workers only accept requests once all the data is loaded, but hold a
+single copy of it. Forking while the warm-up thread of the master is
+loading would leave the workers with its locks held, so the master waits
+for it rather than letting each worker load the data again.
+"""
+
+import gc
+import os
+
+preload_app = True
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 8))
+
+
+def when_ready(_server):
+    # pylint: disable=import-outside-toplevel
+    from viz import registry
+
+    # Wait for the warm-up, the workers then have all the data
+    registry.load_all()
+
+    # Keep the garbage collector from writing to the shared objects
+    gc.freeze()
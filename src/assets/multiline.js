@@ -0,0 +1,32 @@
+// Multiline chart callbacks, run in the browser
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+  multiline: {
+    // Show the traces of the display mode and the selected crises
+    update_mode: function (displayMode, checklistValues, figure) {
+      const maxY = figure.layout.meta.max_y[displayMode];
+      const crises = ["2008", "covid"];
+
+      const data = figure.data.map((trace) => ({
+        ...trace,
+        visible: trace.meta === displayMode,
+      }));
+      const shapes = figure.layout.shapes.map((shape, i) => ({
+        ...shape,
+        visible: checklistValues.includes(crises[i]),
+        y1: maxY,
+      }));
+      const annotations = figure.layout.annotations.map((annotation, i) => ({
+        ...annotation,
+        visible: checklistValues.includes(crises[i]),
+        y: maxY,
+      }));
+
+      return {
+        ...figure,
+        data: data,
+        layout: { ...figure.layout, shapes: shapes, annotations: annotations },
+      };
+    },
+  },
+});
@@ -0,0 +1,3 @@
+"""
+For python to recognize this folder as a package.
+"""
@@ -0,0 +1,333 @@
+"""
+Latency benchmark of the callbacks of the app.
+
+Drives every server callback of the app through the Flask test client,
+as the browser does on /_dash-update-component, for every valid
+combination of its inputs and each input triggering it. Runs offline on
+the data of the data folder. Reports, for each callback and trigger,
+the p50, p95 and p99 latencies and the response bytes, of the first pass
+(figures built, "cold") and of the next ones (figures cached, "warm").
+Clientside callbacks, run by the browser, are listed as skipped, and the
+combinations whose data is missing from the data folder are left out
+and listed.
+
+Run from the src folder:
+
+    python -m benchmarks.callbacks
+    python -m benchmarks.callbacks --output callbacks.json
+    python -m benchmarks.callbacks --baseline callbacks.json
+
+With a baseline, exits with an error if a latency or response size got
+bigger than the tolerance allows.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# Latency percentiles of the report
+PERCENTILES = [50, 95, 99]
+
+# Allowed relative increase of a measure over its baseline
+TOLERANCE = 0.25
+
+# Increases below these are noise, whatever their relative size
+MIN_MS = 1
+MIN_BYTES = 256
+
+
+def input_grids():
+    """
+    Valid combinations of the inputs of the server callbacks.
+
+    Returns:
+        The dict of the lists of input values by "id.property", by output
+        of the callbacks, and the dict of the lists of the data missing
+        from the data folder, by output, whose combinations are left out.
+    """
+    # pylint: disable=import-outside-toplevel
+    from viz import cluster, histogram
+    from viz import map as map_viz
+    from viz import stacked_bar_chart
+
+    grids = defaultdict(list)
+    unavailable = defaultdict(list)
+    aggregations = map_viz.load_aggregations()
+    for time_filter, geolevel in itertools.product(
+        map_viz.TimeFilter, map_viz.GeoLevel
+    ):
+        if (geolevel, time_filter) not in aggregations:
+            unavailable["choropleth.figure"].append(
+                map_viz.DataAggregation.path(geolevel, time_filter)
+            )
+
+    for crime, time_filter, geolevel in itertools.product(
+        map_viz.CRIMES, map_viz.SCALES_LENGTHS, [g.value for g in map_viz.GeoLevel]
+    ):
+        key = (map_viz.GeoLevel(geolevel), map_viz.TimeFilter(time_filter))
+        if key not in aggregations:
+            continue
+        for time_index in range(map_viz.SCALES_LENGTHS[time_filter]):
+            grids["choropleth.figure"].append(
+                {
+                    "crime-category-dropdown.value": crime,
+                    "time-slider.value": time_index,
+                    "time-filter-dropdown.value": time_filter,
+                    "geo-level-dropdown.value": geolevel,
+                }
+            )
+
+    for time_filter, geolevel in itertools.product(
+        map_viz.SCALES_LENGTHS, [g.value for g in map_viz.GeoLevel]
+    ):
+        grids["..time-slider.max...time-slider.marks...time-slider.value.."].append(
+            {
+                "time-filter-dropdown.value": time_filter,
+                "geo-level-dropdown.value": geolevel,
+            }
+        )
+
+    for time_filter, crime_type in itertools.product(
+        [t.name.lower() for t in histogram.TimeFilters], histogram.CRIME_TYPES
+    ):
+        grids["histogram.figure"].append(
+            {
+                "histogram-time-filter-dropdown.value": time_filter,
+                "crime-type-dropdown.value": crime_type,
+            }
+        )
+
+    for year in range(cluster.MIN_YEAR, cluster.MAX_YEAR + 1):
+        grids["cluster-plot.figure"].append({"year-slider.value": year})
+
+    for mode in stacked_bar_chart.load_counts():
+        grids["stacked_bar_chart.figure"].append(
+            {"stacked-bar-chart-dropdown.value": mode}
+        )
+
+    for n_clicks in [None, 1]:
+        grids["button-start.style"].append({"button-start.n_clicks": n_clicks})
+
+    return grids, unavailable
+
+
+def parse_outputs(output):
+    # Multiple outputs are joined as "..id.property...id.property.."
+    names = output[2:-2].split("...") if output.startswith("..") else [output]
+    return [dict(zip(["id", "property"], name.rsplit(".", 1))) for name in names]
+
+
+def request_body(output, callback, values, trigger):
+    """
+    Body of the request of a callback, as sent by the browser.
+
+    Args:
+        output: The output of the callback.
+        callback: The entry of the callback map of the app.
+        values: The values of its inputs and states by "id.property".
+        trigger: The "id.property" of the input triggering the callback.
+    Returns:
+        The JSON body.
+    """
+
+    def dependencies(specs):
+        return [
+            {**spec, "value": values[f"{spec['id']}.{spec['property']}"]}
+            for spec in specs
+        ]
+
+    outputs = parse_outputs(output)
+    return json.dumps(
+        {
+            "output": output,
+            "outputs": outputs if len(outputs) > 1 else outputs[0],
+            "inputs": dependencies(callback["inputs"]),
+            "changedPropIds": [trigger],
+            "state": dependencies(callback["state"]),
+        }
+    )
+
+
+def summarize(latencies, sizes):
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        **{
+            f"p{percentile}_ms": float(np.percentile(latencies, percentile))
+            for percentile in PERCENTILES
+        },
+        "mean_bytes": float(np.mean(sizes)),
+        "max_bytes": int(np.max(sizes)),
+    }
+
+
+def benchmark(passes=2):
+    """
+    Benchmark the callbacks of the app.
+
+    Args:
+        passes: The number of passes over the inputs grids of each
+            trigger, the first one building the figures.
+    Returns:
+        The dict of the results by callback, of the skipped callbacks and
+        of the data missing for some combinations of the inputs.
+    """
+    # pylint: disable=import-outside-toplevel
+    import app as app_module
+    from viz.cache import FIGURES
+
+    app = app_module.app
+    client = app.server.test_client()
+    # Sets up the server, as the first request of a browser
+    response = client.get("/_dash-layout")
+    if response.status_code != 200:
+        raise RuntimeError(f"/_dash-layout failed with {response.status_code}")
+    grids, unavailable = input_grids()
+
+    results = {}
+    skipped = {}
+    for output, callback in app.callback_map.items():
+        if "callback" not in callback:
+            skipped[output] = "clientside"
+            continue
+        if output not in grids:
+            skipped[output] = "no inputs grid"
+            continue
+
+        triggers = {}
+        for spec in callback["inputs"]:
+            trigger = f"{spec['id']}.{spec['property']}"
+            measures = {"cold": ([], []), "warm": ([], [])}
+            FIGURES.clear()
+            for index in range(passes):
+                latencies, sizes = measures["cold" if index == 0 else "warm"]
+                for values in grids[output]:
+                    body = request_body(output, callback, values, trigger)
+                    start = time.perf_counter()
+                    response = client.post(
+                        "/_dash-update-component",
+                        data=body,
+                        content_type="application/json",
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    if response.status_code not in (200, 204):
+                        raise RuntimeError(
+                            f"{output} failed with {response.status_code} for {values}"
+                        )
+                    sizes.append(len(response.data))
+            triggers[trigger] = {
+                kind: summarize(*measure)
+                for kind, measure in measures.items()
+                if measure[0]
+            }
+
+        results[output] = {
+            "function": callback["callback"].__name__,
+            "combinations": len(grids[output]),
+            "triggers": triggers,
+        }
+
+    return {"callbacks": results, "skipped": skipped, "unavailable": unavailable}
+
+
+def environment():
+    # pylint: disable=import-outside-toplevel
+    import dash
+    import pandas as pd
+    import plotly
+
+    return {
+        "python": platform.python_version(),
+        "dash": dash.__version__,
+        "plotly": plotly.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def rows(results):
+    for result in results["callbacks"].values():
+        for trigger, kinds in result["triggers"].items():
+            for kind, stats in kinds.items():
+                yield (result["function"], trigger, kind), stats
+
+
+def report(results):
+    print(
+        f"{'Callback':<28}{'Trigger':<38}{'Pass':<6}{'Requests':>9}"
+        + "".join(f"{f'p{p} (ms)':>10}" for p in PERCENTILES)
+        + f"{'Mean bytes':>12}"
+    )
+    for (function, trigger, kind), stats in rows(results):
+        print(
+            f"{function:<28}{trigger:<38}{kind:<6}{stats['requests']:>9}"
+            + "".join(f"{stats[f'p{p}_ms']:>10.2f}" for p in PERCENTILES)
+            + f"{stats['mean_bytes']:>12.0f}"
+        )
+    for output, reason in results["skipped"].items():
+        print(f"Skipped {output}: {reason}")
+    for output, missing in results.get("unavailable", {}).items():
+        print(f"Partial {output}, missing {', '.join(missing)}")
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """
+    Latencies and response sizes bigger than in a baseline.
+
+    Args:
+        results: The results of benchmark.
+        baseline: The results of a previous benchmark.
+        tolerance: The allowed relative increase.
+    Returns:
+        The list of messages describing the regressions.
+    """
+    previous = dict(rows(baseline))
+    measures = [(f"p{p}_ms", MIN_MS) for p in PERCENTILES]
+    measures.append(("mean_bytes", MIN_BYTES))
+    messages = []
+    for key, stats in rows(results):
+        if key not in previous:
+            continue
+        for measure, minimum in measures:
+            before, after = previous[key][measure], stats[measure]
+            if after > before * (1 + tolerance) and after - before > minimum:
+                messages.append(
+                    f"{' '.join(key)}: {measure} {before:.2f} -> {after:.2f}"
+                )
+    return messages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--passes", type=int, default=2, help="number of passes over the inputs"
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of previous results")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="allowed relative increase over the baseline",
+    )
+    args = parser.parse_args()
+
+    results = {"environment": environment(), **benchmark(args.passes)}
+    report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            messages = regressions(results, json.load(f), args.tolerance)
+        for message in messages:
+            print(f"Regression of {message}")
+        if messages:
+            sys.exit(1)
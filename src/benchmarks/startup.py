@@ -0,0 +1,264 @@
+"""
+Startup profile of the app.
+
+Measures, in fresh interpreters, the time and memory of each step of the
+startup of the server: importing the heavy dependencies, each viz module
+and app.py, building the first layout and finishing the warm-up of the
+data. Also ranks the packages imported by app.py by their own import
+time (python -X importtime).
+
+Run from the src folder:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --baseline startup.json
+
+With a baseline, exits with an error if a step got slower or bigger than
+the tolerance allows, to catch regressions.
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import pkgutil
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Dependencies imported first, to measure them apart from the modules of the app
+DEPENDENCIES = [
+    "numpy",
+    "pandas",
+    "pyarrow",
+    "plotly",
+    "flask",
+    "dash",
+    "shapely",
+    "sklearn",
+    "geopandas",
+]
+
+# Number of packages of the ranked import times report
+TOP_PACKAGES = 15
+
+# Allowed relative increase of a step over its baseline
+TOLERANCE = 0.25
+
+# Increases below these are noise, whatever their relative size
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 5
+
+
+def rss_mb():
+    """
+    Resident memory of this process, in MB.
+    """
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm", "r", encoding="utf-8") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+    # Peak memory elsewhere, in kilobytes, or bytes on macOS
+    import resource  # pylint: disable=import-outside-toplevel
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+def measure_steps():
+    """
+    Run the steps of the startup in this interpreter.
+
+    Returns:
+        The list of steps, with their name, duration in seconds and
+        increase of the resident memory in MB.
+    """
+    steps = []
+
+    def step(name, run):
+        rss = rss_mb()
+        start = time.perf_counter()
+        run()
+        steps.append(
+            {
+                "step": name,
+                "seconds": time.perf_counter() - start,
+                "rss_mb": rss_mb() - rss,
+            }
+        )
+
+    for dependency in DEPENDENCIES:
+        if importlib.util.find_spec(dependency) is not None:
+            step(dependency, lambda name=dependency: importlib.import_module(name))
+
+    import viz  # pylint: disable=import-outside-toplevel
+
+    for module in pkgutil.iter_modules(viz.__path__):
+        name = f"viz.{module.name}"
+        step(name, lambda name=name: importlib.import_module(name))
+
+    app = None
+
+    def import_app():
+        nonlocal app
+        app = importlib.import_module("app")
+
+    step("app", import_app)
+
+    client = app.server.test_client()
+
+    def first_layout():
+        response = client.get("/_dash-layout")
+        if response.status_code != 200:
+            raise RuntimeError(f"/_dash-layout failed with {response.status_code}")
+
+    step("first layout", first_layout)
+
+    def wait_warm_up():
+        for thread in threading.enumerate():
+            if thread.name == "viz-warm-up":
+                thread.join()
+
+    step("warm-up", wait_warm_up)
+    return steps
+
+
+def import_times():
+    """
+    Own import time of the packages imported by app.py, in a fresh
+    interpreter.
+
+    Returns:
+        The dict of seconds by top-level package.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = defaultdict(float)
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        times[name.strip().split(".")[0]] += int(own) / 1e6
+    return dict(times)
+
+
+def profile(repeat=1, cold=False):
+    """
+    Profile the startup of the app.
+
+    Args:
+        repeat: The number of runs, each step keeping its fastest one.
+        cold: Whether to delete the materialized tables before each run.
+    Returns:
+        The dict of the steps and of the import times by package.
+    """
+    # pylint: disable=import-outside-toplevel
+    from store import STORE_FOLDER
+
+    runs = []
+    for _ in range(repeat):
+        if cold:
+            shutil.rmtree(STORE_FOLDER, ignore_errors=True)
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"The startup failed:\n{process.stderr}")
+        runs.append(json.loads(process.stdout.splitlines()[-1]))
+
+    steps = [
+        min((run[i] for run in runs), key=lambda step: step["seconds"])
+        for i in range(len(runs[0]))
+    ]
+    return {"steps": steps, "imports": import_times()}
+
+
+def report(results):
+    print(f"{'Step':<28}{'Seconds':>10}{'RSS (MB)':>10}")
+    for step in results["steps"]:
+        name = step["step"]
+        if name in DEPENDENCIES and name not in results["imports"]:
+            name += " (unused)"
+        print(f"{name:<28}{step['seconds']:>10.3f}{step['rss_mb']:>10.1f}")
+    total = sum(step["seconds"] for step in results["steps"])
+    print(f"{'total':<28}{total:>10.3f}")
+
+    print()
+    print(f"{'Package imported by app':<28}{'Seconds':>10}")
+    ranked = sorted(results["imports"].items(), key=lambda item: -item[1])
+    for package, seconds in ranked[:TOP_PACKAGES]:
+        print(f"{package:<28}{seconds:>10.3f}")
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """
+    Steps slower or bigger than in a baseline.
+
+    Args:
+        results: The results of profile.
+        baseline: The results of a previous profile.
+        tolerance: The allowed relative increase.
+    Returns:
+        The list of messages describing the regressions.
+    """
+    previous = {step["step"]: step for step in baseline["steps"]}
+    messages = []
+    for step in results["steps"]:
+        if step["step"] not in previous:
+            continue
+        for key, minimum in [("seconds", MIN_SECONDS), ("rss_mb", MIN_RSS_MB)]:
+            before, after = previous[step["step"]][key], step[key]
+            if after > before * (1 + tolerance) and after - before > minimum:
+                messages.append(f"{step['step']}: {key} {before:.3f} -> {after:.3f}")
+    return messages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs")
+    parser.add_argument(
+        "--cold", action="store_true", help="materialize the tables in every run"
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of previous results")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="allowed relative increase over the baseline",
+    )
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_steps()))
+        sys.stdout.flush()
+        # Skip the shutdown of the imported modules and threads
+        os._exit(0)
+
+    results = profile(args.repeat, args.cold)
+    report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            messages = regressions(results, json.load(f), args.tolerance)
+        for message in messages:
+            print(f"Regression of {message}")
+        if messages:
+            sys.exit(1)
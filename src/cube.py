@@ -0,0 +1,108 @@
+"""
+Dense count cubes.
+
+A cube holds the counts of crimes over the cartesian product of the
+labels of several dimensions (year, primary type, beat, hour...), as a
+zero-filled N-dimensional array, so that operations over whole
+dimensions are plain NumPy reductions.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class CountCube:
+    """
+    Zero-filled counts over the cartesian product of dimensions labels.
+    """
+
+    def __init__(self, dims, labels, values):
+        self.dims = list(dims)
+        self.labels = [np.asarray(dim_labels) for dim_labels in labels]
+        self.values = values
+
+    @classmethod
+    def from_counts(cls, counts, dims, value="count"):
+        """
+        Build the cube of a long DataFrame of counts, in one step.
+
+        Args:
+            counts: The DataFrame with one column per dimension and the
+                value column, possibly with several rows per cell.
+            dims: The dimension columns.
+            value: The count column.
+        Returns:
+            The cube, with the labels of each dimension sorted.
+        """
+        codes, labels = zip(*(pd.factorize(counts[dim], sort=True) for dim in dims))
+        values = np.zeros([len(dim_labels) for dim_labels in labels], dtype=np.int64)
+        np.add.at(values, codes, counts[value].to_numpy())
+        return cls(dims, labels, values)
+
+    def axis(self, dim):
+        return self.dims.index(dim)
+
+    def total(self, dim):
+        """
+        Counts of each label of a dimension, summed over the others.
+
+        Args:
+            dim: The dimension.
+        Returns:
+            A 1D array aligned with the labels of the dimension.
+        """
+        axis = self.axis(dim)
+        others = tuple(i for i in range(len(self.dims)) if i != axis)
+        return self.values.sum(axis=others)
+
+    def fold(self, dim, kept, other):
+        """
+        Sum the labels of a dimension that are not kept into another label.
+
+        Args:
+            dim: The dimension.
+            kept: The labels kept as is.
+            other: The label receiving the others, added if not kept.
+        Returns:
+            The folded cube, with the labels of the dimension sorted.
+        """
+        axis = self.axis(dim)
+        labels = self.labels[axis]
+        is_kept = np.isin(labels, kept)
+        new_labels = np.union1d(labels[is_kept], [other])
+
+        # Work on the dimension as the first axis
+        values = np.moveaxis(self.values, axis, 0)
+        folded = np.zeros((len(new_labels),) + values.shape[1:], dtype=values.dtype)
+        folded[np.searchsorted(new_labels, labels[is_kept])] = values[is_kept]
+        folded[np.searchsorted(new_labels, other)] += values[~is_kept].sum(axis=0)
+        values = np.moveaxis(folded, 0, axis)
+
+        labels = list(self.labels)
+        labels[axis] = new_labels
+        return CountCube(self.dims, labels, values)
+
+    def cumsum(self, dim):
+        """
+        Cumulative counts along a dimension.
+
+        Args:
+            dim: The dimension, accumulated in the order of its labels.
+        Returns:
+            The cube of cumulative counts.
+        """
+        return CountCube(
+            self.dims, self.labels, self.values.cumsum(axis=self.axis(dim))
+        )
+
+    def to_frame(self, name="count"):
+        """
+        Long DataFrame of the cube, one row per cell.
+
+        Args:
+            name: The name of the count column.
+        Returns:
+            The DataFrame, with one column per dimension.
+        """
+        index = pd.MultiIndex.from_product(self.labels, names=self.dims)
+        return pd.DataFrame({name: self.values.ravel()}, index=index).reset_index()
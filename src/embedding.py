@@ -0,0 +1,124 @@
+"""
+Two-dimensional embeddings of the beats for the cluster plot.
+
+Each year is embedded separately. The "tsne" mode starts every year
+from a random layout, so the beats move around from a year to the next.
+The other modes keep the years comparable on the slider:
+
+- "shared": t-SNE initialized from a PCA projection fitted once on all
+  the years, so that every year starts from the same layout.
+- "warm": t-SNE initialized from the layout of the previous year, the
+  beats it does not have being placed from the shared projection.
+  The years are then embedded in order.
+- "pca": the shared projection itself, much cheaper than t-SNE.
+
+The initialized t-SNE layouts are rotated back onto their initial layout,
+so that the axes keep their orientation over the years.
+"""
+
+import numpy as np
+from scipy.linalg import orthogonal_procrustes
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+
+EMBEDDINGS = ["tsne", "shared", "warm", "pca"]
+
+# Iterations of an initialized t-SNE, which starts from a meaningful layout
+INITIALIZED_ITERATIONS = 500
+
+# Spread of the initial layouts, as the one of the "pca" init of TSNE
+INIT_SCALE = 1e-4
+
+
+def fit_projection(matrix):
+    """
+    Fit the projection shared by all the years.
+
+    Args:
+        matrix: The arrest counts per beat and year (rows)
+            and primary type (columns) of all the years.
+    Returns:
+        The fitted PCA.
+    """
+    matrix = matrix.set_axis(matrix.columns.astype(str), axis=1)
+    return PCA(n_components=2, random_state=0).fit(matrix)
+
+
+def project(projection, matrix):
+    """
+    Project the beats of a year with the shared projection.
+
+    Args:
+        projection: The fitted PCA.
+        matrix: The arrest counts per beat and primary type of the year.
+    Returns:
+        An array with one row per beat.
+    """
+    matrix = matrix.set_axis(matrix.columns.astype(str), axis=1)
+    return projection.transform(
+        matrix.reindex(columns=projection.feature_names_in_, fill_value=0)
+    )
+
+
+def warm_layout(reference, beats, previous):
+    """
+    Initial layout of a year from the layout of the previous one.
+
+    The beats missing from the previous layout are placed by the affine
+    map from the shared projection to the previous layout.
+
+    Args:
+        reference: The shared projection of the beats.
+        beats: The beats.
+        previous: The previous layout, a DataFrame indexed by beat.
+    Returns:
+        An array with one row per beat.
+    """
+    known = beats.isin(previous.index)
+    if not known.any():
+        return reference
+
+    layout = np.empty_like(reference)
+    layout[known] = previous.loc[beats[known]].to_numpy()
+    if not known.all():
+        affine_reference = np.column_stack([reference, np.ones(len(reference))])
+        affine, *_ = np.linalg.lstsq(affine_reference[known], layout[known], rcond=None)
+        layout[~known] = affine_reference[~known] @ affine
+    return layout
+
+
+def embed(matrix, mode="tsne", projection=None, previous=None):
+    """
+    Embed the beats of a year in two dimensions.
+
+    Args:
+        matrix: The arrest counts per beat (rows) and primary type
+            (columns) of the year.
+        mode: The embedding, one of EMBEDDINGS.
+        projection: The shared projection, for all the modes but "tsne".
+        previous: The layout of the previous year indexed by beat,
+            for the "warm" mode, None for the first year.
+    Returns:
+        An array with one row per beat.
+    """
+    if mode == "tsne":
+        return TSNE(n_components=2, random_state=0).fit_transform(matrix)
+
+    reference = project(projection, matrix)
+    if mode == "pca":
+        return reference
+    if mode == "warm" and previous is not None:
+        reference = warm_layout(reference, matrix.index, previous)
+
+    reference = reference - reference.mean(axis=0)
+    init = reference / (reference[:, 0].std() or 1.0) * INIT_SCALE
+    layout = TSNE(
+        n_components=2,
+        init=init,
+        max_iter=INITIALIZED_ITERATIONS,
+        random_state=0,
+    ).fit_transform(matrix)
+
+    layout = layout - layout.mean(axis=0)
+    rotation, _ = orthogonal_procrustes(layout, reference)
+    return layout @ rotation
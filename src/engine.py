@@ -0,0 +1,233 @@
+"""
+Single-pass aggregation engine.
+
+Each visualization registers the aggregates it needs, that is group-by
+keys, summed measures and the function writing its files from the
+aggregated counts. The dataset is then scanned once, each chunk updating
+all the selected aggregates at the same time.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import ingest
+import paths as paths
+
+AGGREGATES = {}
+
+
+class Aggregate:
+    """
+    Aggregate registered by a visualization.
+    """
+
+    def __init__(
+        self,
+        name,
+        viz,
+        keys,
+        finalize,
+        measures=(),
+        partition=None,
+        outputs=(),
+        dropna=True,
+    ):
+        self.name = name
+        self.viz = viz
+        self.keys = list(keys)
+        self.measures = list(measures)
+        self.finalize = finalize
+        self.partition = partition
+        self.outputs = list(outputs)
+        self.dropna = dropna
+
+    def counter(self):
+        return ingest.GroupCounter(self.keys, self.measures, self.dropna)
+
+
+def register(
+    name,
+    viz,
+    keys,
+    finalize,
+    measures=(),
+    partition=None,
+    outputs=(),
+    dropna=True,
+):
+    """
+    Register an aggregate.
+
+    Args:
+        name: The unique name of the aggregate.
+        viz: The visualization it is computed for.
+        keys: The group-by columns.
+        finalize: The function called with the aggregated DataFrame,
+            one row per group with the keys, "count" and measures columns.
+        measures: The columns summed per group.
+        partition: The key whose values are processed independently by
+            finalize, which is then also given the changed values as
+            "partitions" when the aggregate is updated.
+        outputs: The files and folders written by finalize.
+        dropna: Whether to drop the crimes missing a key, rather than
+            counting them in groups with a missing key.
+    """
+    if name in AGGREGATES:
+        raise ValueError(f"Aggregate already registered: {name}")
+    AGGREGATES[name] = Aggregate(
+        name, viz, keys, finalize, measures, partition, outputs, dropna
+    )
+
+
+def aggregate(name, viz, keys, measures=(), partition=None, outputs=(), dropna=True):
+    """
+    Decorator registering the decorated finalize function as an aggregate.
+    """
+
+    def decorator(finalize):
+        register(name, viz, keys, finalize, measures, partition, outputs, dropna)
+        return finalize
+
+    return decorator
+
+
+def select(vizs=None):
+    """
+    Registered aggregates of some visualizations.
+
+    Args:
+        vizs: The visualizations, all of them if None.
+    Returns:
+        The list of aggregates.
+    """
+    return [
+        aggregate
+        for aggregate in AGGREGATES.values()
+        if vizs is None or aggregate.viz in vizs
+    ]
+
+
+def scan(chunks, aggregates, prepare=None):
+    """
+    Fill aggregates from a single pass over chunks of crimes.
+
+    Args:
+        chunks: The iterator of DataFrames.
+        aggregates: The aggregates to fill.
+        prepare: The function adding derived columns to each chunk.
+    Returns:
+        A dict of aggregated DataFrames by aggregate name.
+    """
+    counters = {aggregate.name: aggregate.counter() for aggregate in aggregates}
+    for chunk in chunks:
+        if prepare is not None:
+            chunk = prepare(chunk)
+        for counter in counters.values():
+            counter.update(chunk)
+
+    return {name: counter.result() for name, counter in counters.items()}
+
+
+def finalize(aggregates, results, workers=1):
+    """
+    Write the files of aggregates from their aggregated counts.
+
+    Args:
+        aggregates: The aggregates.
+        results: The dict of aggregated DataFrames by aggregate name.
+        workers: The number of aggregates written at once, in threads.
+    """
+    if workers <= 1:
+        for aggregate in aggregates:
+            aggregate.finalize(results[aggregate.name])
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(aggregate.finalize, results[aggregate.name])
+            for aggregate in aggregates
+        ]
+        # Raise the errors of the aggregates
+        for future in futures:
+            future.result()
+
+
+def run(path, columns=None, prepare=None, vizs=None, workers=1):
+    """
+    Scan a crimes file once and write the files of the visualizations.
+
+    Args:
+        path: The crimes file to read.
+        columns: The columns of the file to load.
+        prepare: The function adding derived columns to each chunk.
+        vizs: The visualizations to process, all of them if None.
+        workers: The number of aggregates written at once.
+    """
+    aggregates = select(vizs)
+    results = scan(ingest.read_chunks(path, columns=columns), aggregates, prepare)
+    finalize(aggregates, results, workers)
+
+
+def apply_delta(aggregate, counts, added, removed):
+    """
+    Update aggregated counts with the contributions of added and
+    removed records.
+
+    Args:
+        aggregate: The aggregate.
+        counts: The aggregated DataFrame.
+        added: The aggregated DataFrame of the added records.
+        removed: The aggregated DataFrame of the removed records.
+    Returns:
+        The updated aggregated DataFrame, without empty groups.
+    """
+    values = ["count", *aggregate.measures]
+    removed = removed.copy()
+    removed[values] = -removed[values]
+    parts = [part for part in (counts, added, removed) if not part.empty]
+    if not parts:
+        return counts
+    updated = (
+        pd.concat(parts, ignore_index=True)
+        .groupby(aggregate.keys, observed=True, dropna=aggregate.dropna)[values]
+        .sum()
+        .reset_index()
+    )
+    return updated[updated["count"] != 0].reset_index(drop=True)
+
+
+def state_path(aggregate):
+    return f"{paths.DATA_STATE_FOLDER}/aggregates/{aggregate.name}.parquet"
+
+
+def save_state(aggregate, counts):
+    """
+    Persist the aggregated counts of an aggregate.
+
+    Args:
+        aggregate: The aggregate.
+        counts: The aggregated DataFrame.
+    """
+    os.makedirs(os.path.dirname(state_path(aggregate)), exist_ok=True)
+    # Categorical keys of different chunks are merged, store plain values
+    counts.astype(
+        {
+            key: object
+            for key in aggregate.keys
+            if isinstance(counts[key].dtype, pd.CategoricalDtype)
+        }
+    ).to_parquet(state_path(aggregate), index=False)
+
+
+def load_state(aggregate):
+    """
+    Load the persisted aggregated counts of an aggregate.
+
+    Args:
+        aggregate: The aggregate.
+    Returns:
+        The aggregated DataFrame.
+    """
+    return pd.read_parquet(state_path(aggregate))
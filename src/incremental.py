@@ -0,0 +1,177 @@
+"""
+Incremental preprocessing driven by the "Updated On" column.
+
+A full build persists, next to the aggregated counts of every aggregate,
+an index of the records they were computed from and the most recent
+"Updated On" seen (the watermark). A refresh then only ingests the
+records updated after the watermark: the contribution of their previous
+version, found in the index, is retracted from the aggregates and the
+contribution of the new one is added, before the visualizations files
+are written again from the updated counts.
+
+Records deleted from the portal are not seen by a refresh, only a full
+build accounts for them.
+"""
+
+import glob
+import os
+import shutil
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import engine
+import ingest
+import paths as paths
+import schema
+
+RECORDS_FOLDER = f"{paths.DATA_STATE_FOLDER}/records"
+WATERMARK_PATH = paths.DATA_WATERMARK_PATH
+
+# Columns identifying a record and its version
+RECORD_COLUMNS = ["ID", "Updated On"]
+
+
+def load_watermark():
+    """
+    Most recent "Updated On" of the processed records.
+
+    Returns:
+        The timestamp, or None if no build was persisted.
+    """
+    if not os.path.exists(WATERMARK_PATH):
+        return None
+    with open(WATERMARK_PATH, "r", encoding="utf-8") as f:
+        return pd.Timestamp(f.read().strip())
+
+
+def save_watermark(watermark):
+    with open(WATERMARK_PATH, "w", encoding="utf-8") as f:
+        f.write(watermark.isoformat())
+
+
+def records_writer():
+    """
+    Writer of a new part of the records index.
+
+    Returns:
+        The ColumnarWriter of the part.
+    """
+    os.makedirs(RECORDS_FOLDER, exist_ok=True)
+    part = len(glob.glob(f"{RECORDS_FOLDER}/part-*.parquet"))
+    return ingest.ColumnarWriter(f"{RECORDS_FOLDER}/part-{part:05d}.parquet")
+
+
+def lookup_records(ids):
+    """
+    Latest indexed version of some records.
+
+    Args:
+        ids: The IDs of the records.
+    Returns:
+        The typed DataFrame of the records found in the index.
+    """
+    dataset = ds.dataset(RECORDS_FOLDER, format="parquet")
+    table = dataset.to_table(filter=pc.field("ID").isin(list(ids)))
+    records = schema.apply_types(table.to_pandas())
+    return records.sort_values("Updated On").drop_duplicates("ID", keep="last")
+
+
+def build(path, columns, prepare):
+    """
+    Aggregate all the crimes and persist the state needed by refresh.
+
+    Args:
+        path: The crimes file to read.
+        columns: The columns used by the aggregates.
+        prepare: The function adding derived columns to each chunk.
+    Returns:
+        A dict of aggregated DataFrames by aggregate name.
+    """
+    shutil.rmtree(paths.DATA_STATE_FOLDER, ignore_errors=True)
+    aggregates = engine.select()
+    watermark = None
+
+    with records_writer() as writer:
+
+        def chunks():
+            nonlocal watermark
+            for chunk in ingest.read_chunks(path, columns=RECORD_COLUMNS + columns):
+                writer.write(chunk)
+                chunk_watermark = chunk["Updated On"].max()
+                if watermark is None or chunk_watermark > watermark:
+                    watermark = chunk_watermark
+                yield chunk
+
+        results = engine.scan(chunks(), aggregates, prepare)
+
+    for aggregate in aggregates:
+        engine.save_state(aggregate, results[aggregate.name])
+    save_watermark(watermark)
+    return results
+
+
+def refresh(path, columns, prepare):
+    """
+    Apply the records updated since the last build or refresh
+    to the persisted aggregates, and write the changed files again.
+
+    Args:
+        path: The crimes file to read, a full export or the export
+            of the recently updated records.
+        columns: The columns used by the aggregates.
+        prepare: The function adding derived columns to each chunk.
+    Returns:
+        The number of records applied, 0 if there was nothing to do.
+    """
+    watermark = load_watermark()
+    if watermark is None:
+        raise FileNotFoundError("No persisted build to refresh, run a full build")
+    if os.path.getsize(path) == 0:
+        return 0
+
+    # The records of the watermark are read again, as other records may
+    # share it: a record already applied is retracted then added back
+    chunks = [
+        chunk[chunk["Updated On"] >= watermark]
+        for chunk in ingest.read_chunks(path, columns=RECORD_COLUMNS + columns)
+    ]
+    if not chunks:
+        return 0
+    updated = pd.concat(chunks)
+    updated = updated.drop_duplicates("ID", keep="last").reset_index(drop=True)
+    if updated.empty:
+        return 0
+    previous = lookup_records(updated["ID"])
+
+    aggregates = engine.select()
+    # prepare adds columns to the chunks, keep the records as read
+    added = engine.scan([updated.copy()], aggregates, prepare)
+    removed = engine.scan([previous.copy()], aggregates, prepare)
+
+    for aggregate in aggregates:
+        if added[aggregate.name].empty and removed[aggregate.name].empty:
+            continue
+        counts = engine.apply_delta(
+            aggregate,
+            engine.load_state(aggregate),
+            added[aggregate.name],
+            removed[aggregate.name],
+        )
+        engine.save_state(aggregate, counts)
+        if aggregate.partition is None:
+            aggregate.finalize(counts)
+        else:
+            partitions = pd.concat(
+                [
+                    added[aggregate.name][aggregate.partition],
+                    removed[aggregate.name][aggregate.partition],
+                ]
+            ).unique()
+            aggregate.finalize(counts, partitions=partitions)
+
+    with records_writer() as writer:
+        writer.write(updated)
+    save_watermark(updated["Updated On"].max())
+    return len(updated)
@@ -0,0 +1,216 @@
+"""
+Streaming ingestion of the crimes dataset.
+
+The full export of the Chicago data portal does not fit in memory,
+so it is walked in bounded-size chunks which are reduced on the fly
+to partial aggregates merged at the end.
+
+Parsing the CSV export (and its dates above all) is slow, so it can be
+converted once into a typed columnar file (Parquet) next to it, which is
+then read instead of the CSV by every loader.
+"""
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import schema
+
+# Number of rows loaded at once, peak memory is proportional to it
+CHUNK_SIZE = 500_000
+
+
+def columnar_path(path):
+    """
+    Path of the columnar version of a crimes CSV file.
+
+    Args:
+        path: The CSV file.
+    Returns:
+        The Parquet file path.
+    """
+    return f"{os.path.splitext(path)[0]}.parquet"
+
+
+def has_columnar(path):
+    """
+    Whether an up to date columnar version of a crimes CSV file exists.
+
+    Args:
+        path: The CSV file.
+    Returns:
+        True if the Parquet file can be read instead of the CSV.
+    """
+    parquet_path = columnar_path(path)
+    if not os.path.exists(parquet_path):
+        return False
+    if not os.path.exists(path):
+        return True
+    return os.path.getmtime(parquet_path) >= os.path.getmtime(path)
+
+
+def read_chunks(path, columns=None, chunksize=CHUNK_SIZE):
+    """
+    Iterate over a crimes file in bounded-size typed chunks.
+
+    The columnar version of the file is read if it is up to date.
+
+    Args:
+        path: The CSV file to read.
+        columns: The columns to load, all of them if None.
+        chunksize: The number of rows per chunk.
+    Returns:
+        An iterator of DataFrames.
+    """
+    if has_columnar(path):
+        parquet_file = pq.ParquetFile(
+            columnar_path(path), read_dictionary=schema.CATEGORY_COLUMNS
+        )
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield schema.apply_types(batch.to_pandas())
+        return
+
+    with pd.read_csv(
+        path,
+        usecols=columns,
+        dtype=schema.parser_types(columns),
+        chunksize=chunksize,
+    ) as reader:
+        for chunk in reader:
+            yield schema.apply_types(chunk)
+
+
+def load_crimes(path, columns=None):
+    """
+    Load a whole crimes file, typed.
+
+    Args:
+        path: The CSV file to read.
+        columns: The columns to load, all of them if None.
+    Returns:
+        The DataFrame.
+    """
+    if has_columnar(path):
+        table = pq.read_table(
+            columnar_path(path),
+            columns=columns,
+            read_dictionary=schema.CATEGORY_COLUMNS,
+        )
+        return schema.apply_types(table.to_pandas())
+    return schema.apply_types(
+        pd.read_csv(path, usecols=columns, dtype=schema.parser_types(columns))
+    )
+
+
+class ColumnarWriter:
+    """
+    Parquet file of typed crimes written chunk after chunk,
+    one row group per chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def write(self, chunk):
+        """
+        Append a chunk of typed crimes to the file.
+
+        Args:
+            chunk: The DataFrame.
+        """
+        # Dictionary encoding is done by Parquet, store plain strings
+        chunk = chunk.astype(
+            {column: object for column in schema.CATEGORY_COLUMNS if column in chunk}
+        )
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def convert_to_columnar(path, chunksize=CHUNK_SIZE):
+    """
+    Convert a crimes CSV file into its typed columnar version,
+    one row group per chunk.
+
+    Args:
+        path: The CSV file to convert.
+        chunksize: The number of rows per chunk.
+    """
+    with ColumnarWriter(columnar_path(path)) as writer:
+        with pd.read_csv(
+            path, dtype=schema.parser_types(), chunksize=chunksize
+        ) as reader:
+            for chunk in reader:
+                writer.write(schema.apply_types(chunk))
+
+
+class GroupCounter:
+    """
+    Group-by aggregation computed chunk after chunk.
+
+    Each chunk is reduced to one row per group (its size and the sum of
+    the measured columns), which is merged into the running partial
+    result, so that memory depends on the number of groups only.
+    """
+
+    def __init__(self, keys, measures=(), dropna=True):
+        """
+        Args:
+            keys: The group-by columns.
+            measures: The columns summed per group.
+            dropna: Whether to drop the rows missing a key, rather than
+                counting them in groups with a missing key.
+        """
+        self.keys = list(keys)
+        self.measures = list(measures)
+        self.dropna = dropna
+        self.partial = None
+
+    def update(self, chunk):
+        """
+        Add the contribution of a chunk to the partial result.
+
+        Args:
+            chunk: The DataFrame holding the keys and measures columns.
+        """
+        grouped = chunk.groupby(self.keys, observed=True, dropna=self.dropna)
+        partial = grouped[self.measures].sum() if self.measures else None
+        sizes = grouped.size().rename("count")
+        partial = sizes.to_frame() if partial is None else partial.join(sizes)
+
+        if self.partial is None:
+            self.partial = partial
+        else:
+            self.partial = (
+                pd.concat([self.partial, partial])
+                .groupby(level=list(range(len(self.keys))), dropna=self.dropna)
+                .sum()
+            )
+
+    def result(self, name="count"):
+        """
+        Merged aggregation of all the chunks seen so far.
+
+        Args:
+            name: The name of the column holding the group sizes.
+        Returns:
+            A DataFrame with one row per group, the keys as columns.
+        """
+        if self.partial is None:
+            return pd.DataFrame(columns=[*self.keys, name, *self.measures])
+        return self.partial.rename(columns={"count": name}).reset_index()
@@ -11,3 +11,17 @@ DATA_MAP_FOLDER = f"{DATA_FOLDER}/map"
 DATA_STACKEDBC_FOLDER = f"{DATA_FOLDER}/stacked_bar_chart"
 DATA_CLUSTER_FOLDER = f"{DATA_FOLDER}/cluster"
 DATA_MULTILINE_FOLDER = f"{DATA_FOLDER}/multiline"
+
+DATA_BEAT_BOUNDARY_VIEW_PATH = f"{DATA_MAP_FOLDER}/Police_Beat_Boundary_View.geojson"
+DATA_BEATS_BOUNDARIES_PATH = f"{DATA_MAP_FOLDER}/police_beats_boundaries.geojson"
+DATA_DISTRICT_NEIGHBORHOODS_PATH = f"{DATA_MAP_FOLDER}/district_neighborhoods.json"
+
+# Persisted state of the aggregates, for incremental preprocessing
+DATA_STATE_FOLDER = f"{DATA_FOLDER}/state"
+DATA_WATERMARK_PATH = f"{DATA_STATE_FOLDER}/watermark"
+
+# Hashes of the inputs and outputs of the preprocessing stages
+DATA_MANIFEST_PATH = f"{DATA_FOLDER}/manifest.json"
+
+# Derived data cached between runs
+DATA_CACHE_FOLDER = f"{DATA_FOLDER}/cache"
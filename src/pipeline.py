@@ -0,0 +1,255 @@
+"""
+Dependency-tracked preprocessing stages.
+
+Each stage declares the files it reads and writes and the code it runs.
+A manifest stores, for every stage run, the content hashes of its inputs,
+outputs and code, so that a stage is only run again when one of them
+changed. A stage reading the output of another one runs after it,
+independent stages run concurrently.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import paths as paths
+
+MANIFEST_PATH = paths.DATA_MANIFEST_PATH
+
+# Size of the blocks of the hashed files
+BLOCK_SIZE = 1 << 20
+
+
+class Stage:
+    """
+    Named step of the preprocessing.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), code=(), params=None):
+        """
+        Args:
+            name: The unique name of the stage.
+            run: The function called without arguments to run the stage.
+            inputs: The files and folders read by the stage.
+            outputs: The files and folders written by the stage.
+            code: The functions and modules whose source defines the stage.
+            params: The JSON-serializable values the outputs depend on.
+        """
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.params = params
+
+    def code_hash(self):
+        digest = hashlib.sha256()
+        for obj in self.code:
+            digest.update(inspect.getsource(obj).encode())
+        digest.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+
+class FileHasher:
+    """
+    Content hashes of files and folders, computed again only for the
+    files whose size or modification time changed.
+    """
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        key = [stat.st_size, stat.st_mtime_ns]
+        if path in self.known and self.known[path]["key"] == key:
+            return self.known[path]["hash"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        self.known[path] = {"key": key, "hash": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def hash(self, path):
+        """
+        Content hash of a file or folder.
+
+        Args:
+            path: The file or folder.
+        Returns:
+            The hash, or None if the path does not exist.
+        """
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        if not os.path.isdir(path):
+            return None
+
+        digest = hashlib.sha256()
+        for folder, folders, files in os.walk(path):
+            folders.sort()
+            for name in sorted(files):
+                file_path = os.path.join(folder, name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(self.file_hash(file_path).encode())
+        return digest.hexdigest()
+
+    def hashes(self, files):
+        return {path: self.hash(path) for path in files}
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {"stages": {}, "files": {}}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def is_fresh(stage, record, hasher):
+    """
+    Whether the outputs of a stage are up to date.
+
+    Args:
+        stage: The stage.
+        record: The manifest record of its last run, or None.
+        hasher: The FileHasher.
+    Returns:
+        True if the code, inputs and outputs are those of the last run.
+    """
+    if record is None or record["code"] != stage.code_hash():
+        return False
+    outputs = hasher.hashes(stage.outputs)
+    if None in outputs.values():
+        return False
+    return (
+        record["inputs"] == hasher.hashes(stage.inputs) and record["outputs"] == outputs
+    )
+
+
+def sort_stages(stages):
+    """
+    Order stages after the stages producing their inputs.
+
+    Args:
+        stages: The stages.
+    Returns:
+        A dict of the stages producing the inputs of each stage, by name,
+        in execution order.
+    """
+    producers = {output: stage for stage in stages for output in stage.outputs}
+    dependencies = {}
+
+    def visit(stage, visiting):
+        if stage.name in dependencies:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Cycle between the stages: {', '.join(visiting)}")
+        visiting.append(stage.name)
+        upstream = {
+            producers[path].name: producers[path]
+            for path in stage.inputs
+            if path in producers and producers[path] is not stage
+        }
+        for dependency in upstream.values():
+            visit(dependency, visiting)
+        visiting.pop()
+        dependencies[stage.name] = list(upstream)
+
+    for stage in stages:
+        visit(stage, [])
+    return dependencies
+
+
+def upstream(dependencies, targets):
+    """
+    Names of some stages and of all the stages they depend on.
+
+    Args:
+        dependencies: The dependencies of the stages, see sort_stages.
+        targets: The names of the stages.
+    Returns:
+        The set of names.
+    """
+    names = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in dependencies:
+            raise ValueError(f"Unknown stage: {name}")
+        if name not in names:
+            names.add(name)
+            pending.extend(dependencies[name])
+    return names
+
+
+def run(stages, force=False, workers=None, targets=None):
+    """
+    Run the stages whose code, inputs or outputs changed since their last
+    run, and the stages whose inputs they changed.
+
+    Args:
+        stages: The stages.
+        force: Whether to run all the stages.
+        workers: The maximum number of stages running at once.
+        targets: The names of the stages to bring up to date with the
+            stages they depend on, all the stages if None.
+    Returns:
+        The names of the stages that were run.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    dependencies = sort_stages(stages)
+    if targets is not None:
+        selected = upstream(dependencies, targets)
+        dependencies = {
+            name: names for name, names in dependencies.items() if name in selected
+        }
+    manifest = load_manifest()
+    hasher = FileHasher(manifest["files"])
+    executed = []
+
+    def execute(stage):
+        if not force and is_fresh(stage, manifest["stages"].get(stage.name), hasher):
+            return None
+        for path in stage.inputs:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Missing input of stage {stage.name}: {path}")
+        stage.run()
+        return {
+            "code": stage.code_hash(),
+            "inputs": hasher.hashes(stage.inputs),
+            "outputs": hasher.hashes(stage.outputs),
+        }
+
+    pending = list(dependencies)
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for name in [
+                name
+                for name in pending
+                if all(dependency in done for dependency in dependencies[name])
+            ]:
+                pending.remove(name)
+                running[executor.submit(execute, by_name[name])] = name
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                record = future.result()
+                if record is not None:
+                    manifest["stages"][name] = record
+                    manifest["files"] = dict(hasher.known)
+                    save_manifest(manifest)
+                    executed.append(name)
+                done.add(name)
+
+    return executed
@@ -3,95 +3,155 @@ Preprocess data to avoid repetitve computing and
 allow faster diplay of figures.
 """
 
-import datetime
-
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache, partial
+
+import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
-from sklearn.manifold import TSNE
+from threadpoolctl import threadpool_limits
 
+import embedding
+import engine
+import incremental
+import ingest
 import paths as paths
+import pipeline
+import sampling
+import schema
+import spatial
+import temporal
+from cube import CountCube
 
 ############################################
 # DATA REDUCTION
 ############################################
 
 
-def reduce_data():
+# Reduction of the full dataset: a fraction of the crimes, or a fixed-size
+# sample optionally stratified by columns among "year" and the crimes columns
+REDUCED_FRACTION = 0.001
+REDUCED_SIZE = None
+REDUCED_STRATA = []
+REDUCED_SEED = 0
+
+
+def write_reduced(chunk, header):
+    chunk.to_csv(
+        paths.DATA_REDUCED_PATH,
+        mode="w" if header else "a",
+        header=header,
+        index=False,
+        date_format=schema.DATE_FORMAT,
+    )
+
+
+def reduce_data(fraction=REDUCED_FRACTION, size=None, strata=(), seed=REDUCED_SEED):
     """
-    Reduce "crimes.csv" very large file into a smaller one
-    by taking randomly 1 record out of 1000.
+    Reduce "crimes.csv" very large file into a smaller one, in a single
+    pass over it with bounded memory.
+
+    By default, each record is taken with a probability of fraction
+    (1 out of 1000). With a size, a sample of exactly that many records
+    is taken, stratified by the strata columns if any: each stratum
+    then has its share of the records of the full file, counted by a
+    first pass over the strata columns.
+
+    Args:
+        fraction: The expected fraction of the records in the sample.
+        size: The number of records of the sample.
+        strata: The columns stratifying the sample of fixed size.
+        seed: The seed of the random sampling.
     """
+    if strata and size is None:
+        raise ValueError("A stratified sample needs a size")
+
+    if size is None:
+        rng = np.random.default_rng(seed)
+        header = True
+        for chunk in ingest.read_chunks(paths.DATA_PATH):
+            write_reduced(chunk[rng.random(len(chunk)) < fraction], header)
+            header = False
+        return
+
+    def strata_chunks(columns=None):
+        for chunk in ingest.read_chunks(paths.DATA_PATH, columns=columns):
+            if "year" in strata:
+                chunk = temporal.add_temporal_features(chunk, ["year"])
+            yield chunk
+
+    sampler = sampling.ReservoirSampler(size, strata, seed)
+    if strata:
+        for chunk in strata_chunks(
+            ["Date" if column == "year" else column for column in strata]
+        ):
+            sampler.count(chunk)
+    for chunk in strata_chunks():
+        sampler.update(chunk)
+    write_reduced(sampler.result().drop(columns=["year"], errors="ignore"), True)
 
-    data = pd.read_csv(paths.DATA_PATH)
-    data = data.sample(frac=0.1)
-    data.to_csv("reduced10.csv", index=False)
 
 ############################################
 # MULTILINE
 ############################################
 
+
 def process_multiline(data):
     """
     Process the data for the visualization.
 
     Args:
-        data: The data to process.
+        data: The number of crimes ("Annual") per "Year" and "Primary Type".
     Returns:
         The processed data.
     """
-    total_crimes = data.shape[0]
-    # Convert data to datetime, get year and group by year and primary type
-    data["Date"] = pd.to_datetime(data["Date"], format="%m/%d/%Y %I:%M:%S %p")
-    data["Year"] = data["Date"].dt.year
-    data = data.groupby(["Year", "Primary Type"]).size().reset_index(name="Annual")
-
-    # Complete with 0 for the years that don't have data
-    for year in data["Year"].unique():
-        for primary_type in data["Primary Type"].unique():
-            if primary_type not in data[data["Year"] == year]["Primary Type"].values:
-                data = pd.concat(
-                    [
-                        data,
-                        pd.DataFrame(
-                            {
-                                "Year": [year],
-                                "Primary Type": [primary_type],
-                                "Annual": [0],
-                            }
-                        ),
-                    ]
-                )
-
-    # Annual the number of crimes per primary type
-    annual_crimes = data.groupby(["Primary Type"]).sum().reset_index()
-    annual_crimes = annual_crimes.sort_values(by="Annual", ascending=False)
-    annual_crimes = annual_crimes.drop(columns=["Year"])
+    # Year x primary type counts, completed with 0 for the missing pairs
+    annual = CountCube.from_counts(data, ["Year", "Primary Type"], value="Annual")
+    total_crimes = annual.values.sum()
 
     # Get the crimes that represent 95% of the total
-    annual_crimes["Cumulative"] = annual_crimes["Annual"].cumsum() / total_crimes
-    annual_crimes = annual_crimes[annual_crimes["Cumulative"] <= 0.95]
-
-    # Calculate the number of crimes that are not in the top 95%
-    other_offense = data[~data["Primary Type"].isin(annual_crimes["Primary Type"])]
-    other_offense = other_offense.groupby("Year").sum().reset_index()
-    other_offense["Primary Type"] = "OTHER OFFENSE"
-
-    # Append the other offenses to the data
-    data = data[data["Primary Type"].isin(annual_crimes["Primary Type"])]
-    if "OTHER OFFENSE" in data["Primary Type"].unique():
-        data.loc[data["Primary Type"] == "OTHER OFFENSE", "Annual"] += other_offense[
-            "Annual"
-        ].values
-    else:
-        data = data.append(other_offense, ignore_index=True)
+    type_totals = annual.total("Primary Type")
+    order = np.argsort(-type_totals, kind="stable")
+    cumulative = type_totals[order].cumsum() / total_crimes
+    top_types = annual.labels[annual.axis("Primary Type")][order[cumulative <= 0.95]]
+
+    # Add the crimes that are not in the top 95% to the other offenses
+    annual = annual.fold("Primary Type", top_types, "OTHER OFFENSE")
 
     # Get the cumulative sum
-    data["Cumulative"] = data.groupby("Primary Type")["Annual"].cumsum()
+    data = annual.to_frame("Annual")
+    data["Cumulative"] = annual.cumsum("Year").values.ravel()
 
     assert total_crimes == data["Annual"].sum()
 
     # Save the data in csv
-    data.to_csv("f{paths.DATA_MULTILINE_FOLDER}/multiline.csv", index=False)
+    data.to_csv(f"{paths.DATA_MULTILINE_FOLDER}/multiline.csv", index=False)
+
+
+@engine.aggregate(
+    "multiline",
+    "multiline",
+    keys=["year", "Primary Type"],
+    outputs=[f"{paths.DATA_MULTILINE_FOLDER}/multiline.csv"],
+)
+def finalize_multiline(counts):
+    process_multiline(counts.rename(columns={"year": "Year", "count": "Annual"}))
+
+
+def preprocess_multiline(path=paths.DATA_PATH):
+    """
+    Count the crimes per year and primary type, streaming the dataset,
+    and process these counts for the multiline chart.
+
+    Args:
+        path: The crimes file to read.
+    """
+    preprocess_all(path, vizs=["multiline"])
+
 
 ############################################
 # HISTOGRAM
@@ -190,60 +250,53 @@ CRIMES_CATEGORIES = {
     "White Collar": ["DECEPTIVE PRACTICE"],
 }
 
-def weekday(date):
-    date = datetime.datetime.strptime(date, "%m/%d/%Y %I:%M:%S %p")
-    return date.strftime("%A")
 
+TIME_ORDERS = {
+    "Weekday": temporal.WEEKDAYS,
+    "Month": temporal.MONTHS,
+    "Time of Day": ["Morning", "Afternoon", "Evening", "Night"],
+}
 
-def time_of_day(date):
-    date = datetime.datetime.strptime(date, "%m/%d/%Y %I:%M:%S %p")
-    hour = date.hour
-    if 0 <= hour < 6:
-        return "Night"
-    if 6 <= hour < 12:
-        return "Morning"
-    if 12 <= hour < 18:
-        return "Afternoon"
-    if 18 <= hour < 24:
-        return "Evening"
 
-    raise ValueError(f"Invalid hour: {hour}")
+# Histogram fields, with their output name and temporal feature
+HISTOGRAM_FIELDS = [
+    ("Weekday", "day", "weekday"),
+    ("Month", "month", "month"),
+    ("Time of Day", "time_of_day", "time_of_day"),
+]
 
 
-def month(date):
-    date = datetime.datetime.strptime(date, "%m/%d/%Y %I:%M:%S %p")
-    return date.strftime("%B")
+def write_histogram(counts, field, name, feature):
+    """
+    Write the crimes count of a histogram field per crime type.
 
+    Args:
+        counts: The number of crimes per feature code and "Primary Type".
+        field: The histogram field.
+        name: The output name of the field.
+        feature: The temporal feature of the field.
+    """
+    counts[field] = temporal.decode(feature, counts[feature])
+    crime_counts = counts.set_index([field, "Primary Type"])["count"].unstack()
+    crime_counts.insert(0, name, crime_counts.index)
+    crime_counts["Total"] = crime_counts.iloc[:, 1:].sum(axis=1)
+    crime_counts = crime_counts.reindex(TIME_ORDERS[field])
+    crime_counts.to_csv(
+        f"{paths.DATA_HISTOGRAM_FOLDER}/histogram_{name}.csv", index=False
+    )
 
-TIME_ORDERS = {
-    "Weekday": [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
-    ],
-    "Month": [
-        "January",
-        "February",
-        "March",
-        "April",
-        "May",
-        "June",
-        "July",
-        "August",
-        "September",
-        "October",
-        "November",
-        "December",
-    ],
-    "Time of Day": ["Morning", "Afternoon", "Evening", "Night"],
-}
+
+for _field, _name, _feature in HISTOGRAM_FIELDS:
+    engine.register(
+        f"histogram_{_name}",
+        "histogram",
+        keys=[_feature, "Primary Type"],
+        finalize=partial(write_histogram, field=_field, name=_name, feature=_feature),
+        outputs=[f"{paths.DATA_HISTOGRAM_FOLDER}/histogram_{_name}.csv"],
+    )
 
 
-def preprocess_histogram():
+def preprocess_histogram(path=paths.DATA_REDUCED_PATH):
     """
     Aggregates crimes count by :
     * crime types according to the "Primary Type" field.
@@ -251,32 +304,11 @@ def preprocess_histogram():
         - times of the day (morning, afternoon, evening, night)
         - days of the week
         - months according to the "Date" field
-    """
-
-    data = pd.read_csv(paths.DATA_REDUCED_PATH)
-
-    # change data "Primary Type" field according to the CRIMES_CATEGORIES
-    # for category, crimes in CRIMES_CATEGORIES.items():
-    #     data.loc[data["Primary Type"].isin(crimes), "Primary Type"] = category
-
-    # change data "Primary Type" field according to the CRIMES_CATEGORIES
-    # for category, crimes in CRIMES_CATEGORIES.items():
-    #     data.loc[data["Primary Type"].isin(crimes), "Primary Type"] = category
-
-    for field, name, function in [
-        ("Weekday", "day", weekday),
-        ("Month", "month", month),
-        ("Time of Day", "time_of_day", time_of_day),
-    ]:
-        data[field] = data["Date"].apply(function)
-        crime_counts = data.groupby([field, "Primary Type"]).size().unstack()
-        crime_counts.insert(0, name, crime_counts.index)
-        crime_counts["Total"] = crime_counts.iloc[:, 1:].sum(axis=1)
-        crime_counts = crime_counts.reindex(TIME_ORDERS[field])
-        crime_counts.to_csv(
-            f"{paths.DATA_HISTOGRAM_FOLDER}/histogram_{name}.csv", index=False
-        )
 
+    Args:
+        path: The crimes file to read.
+    """
+    preprocess_all(path, vizs=["histogram"])
 
 
 ############################################
@@ -284,24 +316,48 @@ def preprocess_histogram():
 ############################################
 
 
-def preprocess_year(df, year):
-    df_year = df[df["Year"] == year]
+# Embedding of the beats, one of embedding.EMBEDDINGS
+CLUSTER_EMBEDDING = "tsne"
+
 
-    # Group by 'Beat' and 'Primary Type' to get arrest counts
-    grouped = (
-        df_year.groupby(["Beat", "Primary Type"])
-        .size()
-        .reset_index(name="Arrest Count")
+def arrest_matrix(counts, index):
+    """
+    Matrix of the arrest counts per primary type.
+
+    Args:
+        counts: The arrest counts per "Year", "Beat" and "Primary Type".
+        index: The rows of the matrix, "Beat" or ["Year", "Beat"].
+    Returns:
+        The DataFrame with one column per primary type.
+    """
+    return (
+        counts.pivot(index=index, columns="Primary Type", values="Arrest Count")
+        .sort_index(axis=1)
+        .fillna(0)
     )
 
+
+def preprocess_year(counts, year, mode="tsne", projection=None, previous=None):
+    """
+    Embed and cluster the beats of a year.
+
+    Args:
+        counts: The arrest counts per "Year", "Beat" and "Primary Type".
+        year: The year.
+        mode: The embedding, one of embedding.EMBEDDINGS.
+        projection: The projection shared by the years, see embedding.embed.
+        previous: The layout of the previous year, see embedding.embed.
+    Returns:
+        The layout of the year, indexed by beat.
+    """
+    # Arrest counts by 'Beat' and 'Primary Type' for the year
+    grouped = counts[counts["Year"] == year]
+
     # Pivot table to create a matrix for clustering
-    pivot_df = grouped.pivot(
-        index="Beat", columns="Primary Type", values="Arrest Count"
-    ).fillna(0)
+    pivot_df = arrest_matrix(grouped, "Beat")
 
-    # Perform t-SNE for dimensionality reduction
-    tsne = TSNE(n_components=2, random_state=0)
-    tsne_result = tsne.fit_transform(pivot_df)
+    # Dimensionality reduction
+    tsne_result = embedding.embed(pivot_df, mode, projection, previous)
 
     # Perform KMeans clustering
     kmeans = KMeans(n_clusters=5, random_state=0)
@@ -317,22 +373,114 @@ def preprocess_year(df, year):
     # Save the results
     tsne_df.to_csv(f"{paths.DATA_CLUSTER_FOLDER}/cluster_{year}.csv", index=False)
 
+    return tsne_df.set_index("Beat")[["TSNE Component 1", "TSNE Component 2"]]
+
+
+def load_layout(year):
+    """
+    Layout of a year written by a previous run.
+
+    Args:
+        year: The year.
+    Returns:
+        The layout indexed by beat, or None if the year was not processed.
+    """
+    path = f"{paths.DATA_CLUSTER_FOLDER}/cluster_{year}.csv"
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, index_col="Beat")[["TSNE Component 1", "TSNE Component 2"]]
+
+
+# Number of worker processes for the years, 1 to process them serially
+# and 0 to use all the cores
+CLUSTER_WORKERS = 0
+
+# Arguments of preprocess_year of the worker process, shared by all its years
+_worker_args = None
 
-def preprocess_cluster():
-    df = pd.read_csv(paths.DATA_PATH)
+# Limits of the BLAS and OpenMP threads of the worker process
+_worker_limits = None
 
-    # Convert 'Date' to datetime and extract the year
-    df["Date"] = pd.to_datetime(df["Date"])
-    df["Year"] = df["Date"].dt.year
 
-    years = df["Year"].unique()
+def _init_cluster_worker(counts, mode, projection):
+    global _worker_args, _worker_limits  # pylint: disable=global-statement
+    _worker_args = (counts, mode, projection)
+    # The years are already spread over the cores, more threads per worker
+    # would only oversubscribe them
+    _worker_limits = threadpool_limits(1)
 
-    for year in years:
-        preprocess_year(df, year)
+
+def _preprocess_worker_year(year):
+    counts, mode, projection = _worker_args
+    preprocess_year(counts, year, mode, projection)
+
+
+def preprocess_years(counts, years, workers=0, mode="tsne"):
+    """
+    Cluster the beats of several years.
+
+    In parallel, the counts are handed once to each worker process
+    rather than with every year, and the years are processed exactly
+    as in the serial run, so the output files are identical. Each worker
+    runs its numerical libraries on a single thread. The "warm"
+    embedding chains the years, which are then processed serially.
+
+    Args:
+        counts: The arrest counts per "Year", "Beat" and "Primary Type".
+        years: The sorted years to process.
+        workers: The number of worker processes, 0 for all the cores.
+        mode: The embedding, one of embedding.EMBEDDINGS.
+    """
+    projection = None
+    if mode != "tsne":
+        projection = embedding.fit_projection(arrest_matrix(counts, ["Year", "Beat"]))
+
+    if mode == "warm":
+        # The first year starts from the layout written by a previous run
+        previous = load_layout(years[0] - 1) if len(years) else None
+        for year in years:
+            previous = preprocess_year(counts, year, mode, projection, previous)
+        return
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(years) <= 1:
+        for year in years:
+            preprocess_year(counts, year, mode, projection)
+        return
+
+    # Not forked, as the pipeline runs the stages in threads
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(years)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_cluster_worker,
+        initargs=(counts, mode, projection),
+    ) as executor:
+        # Consume the results to raise the errors of the workers
+        list(executor.map(_preprocess_worker_year, years))
+
+
+@engine.aggregate(
+    "cluster",
+    "cluster",
+    keys=["year", "Beat", "Primary Type"],
+    partition="year",
+    outputs=[paths.DATA_CLUSTER_FOLDER],
+)
+def finalize_cluster(counts, partitions=None):
+    counts = counts.rename(columns={"year": "Year", "count": "Arrest Count"})
+
+    # Only the changed years are processed again on refresh with "tsne".
+    # The other modes refit their projection on all the years, so every
+    # year is embedded again to match a full build
+    years = counts["Year"].unique()
+    if partitions is not None and CLUSTER_EMBEDDING == "tsne":
+        years = partitions
+
+    preprocess_years(counts, sorted(years), CLUSTER_WORKERS, CLUSTER_EMBEDDING)
 
     # min and max years for the slider
-    min_year = df["Year"].min()
-    max_year = df["Year"].max()
+    min_year = counts["Year"].min()
+    max_year = counts["Year"].max()
 
     # save in file
     with open(f"{paths.DATA_CLUSTER_FOLDER}/min_max_years", "w", encoding="utf-8") as f:
@@ -341,42 +489,140 @@ def preprocess_cluster():
         f.write(str(int(max_year)))
 
 
-if __name__ == "__main__":
-    # preprocess_histogram()
-    reduce_data()
+def preprocess_cluster(path=paths.DATA_PATH):
+    preprocess_all(path, vizs=["cluster"])
+
+
+############################################
+# STACKED BAR CHART
+############################################
+
+# Stacked bar chart modes, with their column, output column and total name
+STACKED_BAR_MODES = [
+    ("district", "District", "District", "j"),
+    ("beat", "Beat", "Beat", "g"),
+    ("type", "Primary Type", "Primary.Type", "l"),
+]
+
+
+def write_arrest_rates(counts, mode, column, output_column, total_name):
+    """
+    Write the number and rate of arrested and not arrested crimes
+    of each value of a column.
+
+    Args:
+        counts: The number of crimes per column value and "Arrest".
+        mode: The stacked bar chart mode.
+        column: The aggregated column.
+        output_column: The name of the column in the output file.
+        total_name: The name of the total count column in the output file.
+    """
+    counts = counts.rename(columns={column: output_column, "count": "n"})
+    counts[total_name] = counts.groupby(output_column)["n"].transform("sum")
+    counts[f"arrest_rate_{mode}"] = (counts["n"] / counts[total_name] * 100).round(1)
+    counts = counts.sort_values(by="n", ascending=False)
+    counts.to_csv(f"{paths.DATA_STACKEDBC_FOLDER}/{mode}_count.csv", index=False)
+
+
+for _mode, _column, _output_column, _total_name in STACKED_BAR_MODES:
+    engine.register(
+        f"stacked_bar_chart_{_mode}",
+        "stacked_bar_chart",
+        keys=[_column, "Arrest"],
+        finalize=partial(
+            write_arrest_rates,
+            mode=_mode,
+            column=_column,
+            output_column=_output_column,
+            total_name=_total_name,
+        ),
+        outputs=[f"{paths.DATA_STACKEDBC_FOLDER}/{_mode}_count.csv"],
+    )
 
 
 ############################################
 # MAP
 ############################################
 
-# File paths
-geojson_path_beatsdistricts = 'src/data/map/Police_Beat_Boundary_View.geojson'
-geojson_path_neighborhoods = 'src/data/map/district_neighborhoods.json'
-
-# Load the reduces data with the required columns 
-columns_to_load = ['Date', 'Block', 'Primary Type', 'Description', 'Location Description', 'Arrest', 'Beat', 'Year', 'Updated On', 'Latitude', 'Longitude']
-df_map = pd.read_csv('src/data/crimes_reduced.csv', usecols=columns_to_load)
-new_column_names = ['date', 'block', 'primary_type', 'description', 'location_description', 'arrest', 'beat', 'year', 'updated_on', 'latitude', 'longitude']
-df_map.columns = new_column_names
-
-# Convert the date column to datetime type
-df_map['date'] = pd.to_datetime(df_map['date'])
-
-# Extract month, day of the week, and hour from the date column
-df_map['month'] = df_map['date'].dt.strftime('%B')
-df_map['day_of_week'] = df_map['date'].dt.strftime('%A')
-df_map['hour'] = df_map['date'].dt.hour
-df_map['beat'] = df_map['beat'].astype(str)
-# Load the GeoJSON files
-with open(geojson_path_beatsdistricts) as f:
-    geojson_beats = json.load(f)
-
-# Extract beats and districts
-beat_district_mapping = {feature['properties']['BEAT_NUMBE']: feature['properties']['DISTRICT'] for feature in geojson_beats['features']}
-beat_district_df = pd.DataFrame(list(beat_district_mapping.items()), columns=['beat', 'district'])
-# Merge the beat-district mapping with the main dataframe
-df_map = df_map.merge(beat_district_df, on='beat', how='left')
+
+@cache
+def load_beat_districts():
+    """
+    District of each beat, from the beats GeoJSON file,
+    loaded on first use only.
+
+    Returns:
+        A DataFrame with the "beat" and "district" columns.
+    """
+    with open(paths.DATA_BEAT_BOUNDARY_VIEW_PATH, encoding="utf-8") as f:
+        geojson_beats = json.load(f)
+
+    # Extract beats and districts
+    beat_district_mapping = {
+        feature["properties"]["BEAT_NUMBE"]: feature["properties"]["DISTRICT"]
+        for feature in geojson_beats["features"]
+    }
+    return pd.DataFrame(
+        list(beat_district_mapping.items()), columns=["beat", "district"]
+    )
+
+
+@cache
+def load_district_neighborhoods():
+    """
+    Neighborhoods of each district, loaded on first use only.
+
+    Returns:
+        A dict of neighborhoods by district string.
+    """
+    with open(paths.DATA_DISTRICT_NEIGHBORHOODS_PATH, "r", encoding="utf-8") as f:
+        district_neighborhoods = json.load(f)
+
+    # Convert district keys to strings for consistency
+    return {str(int(k)): v for k, v in district_neighborhoods.items()}
+
+
+# Add the crime_category column
+category_map = {
+    "BATTERY": "Violent Crimes",
+    "OFFENSE INVOLVING CHILDREN": "Crimes Against Children",
+    "ROBBERY": "Violent Crimes",
+    "THEFT": "Property Crimes",
+    "CRIMINAL DAMAGE": "Property Crimes",
+    "ASSAULT": "Violent Crimes",
+    "BURGLARY": "Property Crimes",
+    "OTHER OFFENSE": "Miscellaneous Crimes",
+    "MOTOR VEHICLE THEFT": "Property Crimes",
+    "WEAPONS VIOLATION": "Public Order Crimes",
+    "STALKING": "Violent Crimes",
+    "DECEPTIVE PRACTICE": "White Collar Crimes",
+    "CRIMINAL SEXUAL ASSAULT": "Violent Crimes",
+    "CRIMINAL TRESPASS": "Property Crimes",
+    "PROSTITUTION": "Public Order Crimes",
+    "NARCOTICS": "Drug Offenses",
+    "INTERFERENCE WITH PUBLIC OFFICER": "Miscellaneous Crimes",
+    "PUBLIC PEACE VIOLATION": "Public Order Crimes",
+    "CONCEALED CARRY LICENSE VIOLATION": "Public Order Crimes",
+    "ARSON": "Property Crimes",
+    "HOMICIDE": "Violent Crimes",
+    "KIDNAPPING": "Violent Crimes",
+    "SEX OFFENSE": "Violent Crimes",
+    "INTIMIDATION": "Violent Crimes",
+    "LIQUOR LAW VIOLATION": "Public Order Crimes",
+    "OBSCENITY": "Public Order Crimes",
+    "GAMBLING": "Public Order Crimes",
+    "PUBLIC INDECENCY": "Public Order Crimes",
+    "NON-CRIMINAL": "Miscellaneous Crimes",
+    "OTHER NARCOTIC VIOLATION": "Drug Offenses",
+    "HUMAN TRAFFICKING": "Miscellaneous Crimes",
+    "CRIM SEXUAL ASSAULT": "Miscellaneous Crimes",
+    "NON-CRIMINAL (SUBJECT SPECIFIED)": "Miscellaneous Crimes",
+    "NON - CRIMINAL": "Miscellaneous Crimes",
+    "RITUALISM": "Miscellaneous Crimes",
+    "DOMESTIC VIOLENCE": "Violent Crimes",
+}
+
+
 def determine_district_from_beat(beat):
     beat_str = str(beat)
     if len(beat_str) == 3:
@@ -386,121 +632,501 @@ def determine_district_from_beat(beat):
     else:
         return np.nan
 
-# Fill missing district values
-df_map.loc[df_map['district'].isnull(), 'district'] = df_map.loc[df_map['district'].isnull(), 'beat'].apply(determine_district_from_beat)
 
-# Load the neighborhoods JSON file
-with open(geojson_path_neighborhoods, 'r') as f:
-    district_neighborhoods = json.load(f)
+def prepare_map_chunk(df_map):
+    """
+    Add the beat, district, neighborhood and category columns
+    used by the map aggregations to a chunk of crimes.
 
-# Convert district keys to strings for consistency
-district_neighborhoods = {str(int(k)): v for k, v in district_neighborhoods.items()}
+    The beat and district are those where the crime is located, or for
+    the crimes without coordinates or outside of the beats, the reported
+    beat and its district.
 
-# Convert district values to strings without leading zeros in the DataFrame for consistency
-df_map['district'] = df_map['district'].apply(lambda x: str(int(x)))
+    Args:
+        df_map: The chunk, with the "Beat", "Latitude", "Longitude"
+            and "Primary Type" columns.
+    Returns:
+        The prepared chunk.
+    """
+    located_beats, located_districts = spatial.load_beat_index().locate(
+        df_map["Longitude"], df_map["Latitude"]
+    )
+    df_map["beat"] = np.where(
+        pd.isnull(located_beats), df_map["Beat"].astype(str), located_beats
+    )
 
-# Map neighborhoods to districts
-df_map['neighborhood'] = df_map['district'].map(district_neighborhoods)
+    # Merge the beat-district mapping with the main dataframe
+    df_map = df_map.merge(load_beat_districts(), on="beat", how="left")
 
-# Add the crime_category column
-category_map = {
-    'BATTERY': 'Violent Crimes',
-    'OFFENSE INVOLVING CHILDREN': 'Crimes Against Children',
-    'ROBBERY': 'Violent Crimes',
-    'THEFT': 'Property Crimes',
-    'CRIMINAL DAMAGE': 'Property Crimes',
-    'ASSAULT': 'Violent Crimes',
-    'BURGLARY': 'Property Crimes',
-    'OTHER OFFENSE': 'Miscellaneous Crimes',
-    'MOTOR VEHICLE THEFT': 'Property Crimes',
-    'WEAPONS VIOLATION': 'Public Order Crimes',
-    'STALKING': 'Violent Crimes',
-    'DECEPTIVE PRACTICE': 'White Collar Crimes',
-    'CRIMINAL SEXUAL ASSAULT': 'Violent Crimes',
-    'CRIMINAL TRESPASS': 'Property Crimes',
-    'PROSTITUTION': 'Public Order Crimes',
-    'NARCOTICS': 'Drug Offenses',
-    'INTERFERENCE WITH PUBLIC OFFICER': 'Miscellaneous Crimes',
-    'PUBLIC PEACE VIOLATION': 'Public Order Crimes',
-    'CONCEALED CARRY LICENSE VIOLATION': 'Public Order Crimes',
-    'ARSON': 'Property Crimes',
-    'HOMICIDE': 'Violent Crimes',
-    'KIDNAPPING': 'Violent Crimes',
-    'SEX OFFENSE': 'Violent Crimes',
-    'INTIMIDATION': 'Violent Crimes',
-    'LIQUOR LAW VIOLATION': 'Public Order Crimes',
-    'OBSCENITY': 'Public Order Crimes',
-    'GAMBLING': 'Public Order Crimes',
-    'PUBLIC INDECENCY': 'Public Order Crimes',
-    'NON-CRIMINAL': 'Miscellaneous Crimes',
-    'OTHER NARCOTIC VIOLATION': 'Drug Offenses',
-    'HUMAN TRAFFICKING': 'Miscellaneous Crimes',
-    'CRIM SEXUAL ASSAULT': 'Miscellaneous Crimes',
-    'NON-CRIMINAL (SUBJECT SPECIFIED)': 'Miscellaneous Crimes',
-    'NON - CRIMINAL': 'Miscellaneous Crimes',
-    'RITUALISM': 'Miscellaneous Crimes',
-    'DOMESTIC VIOLENCE': 'Violent Crimes'
-}
-df_map['crime_category'] = df_map['primary_type'].map(category_map)
-
-# Ensure all necessary columns are categorized correctly
-for col in ['beat', 'district', 'neighborhood', 'primary_type', 'crime_category']:
-    if col in df_map.columns:
-        df_map[col] = df_map[col].astype('category')
-
-# Define the columns to keep
-columns_to_keep = [
-    'date', 'month', 'day_of_week', 'hour', 'block', 'primary_type', 'description', 'location_description',
-    'arrest', 'beat', 'district', 'year', 'updated_on', 'latitude', 'longitude',
-    'neighborhood', 'crime_category'
+    # Fill missing district values
+    df_map["district"] = pd.to_numeric(df_map["district"])
+    df_map["district"] = df_map["district"].where(
+        np.isnan(located_districts), located_districts
+    )
+    missing = df_map["district"].isnull()
+    if missing.any():
+        df_map.loc[missing, "district"] = (
+            df_map.loc[missing, "beat"].map(determine_district_from_beat).astype(float)
+        )
+
+    # Convert district values to strings without leading zeros for consistency
+    df_map["district"] = df_map["district"].apply(lambda x: str(int(x)))
+
+    # Map neighborhoods to districts
+    df_map["neighborhood"] = df_map["district"].map(load_district_neighborhoods())
+
+    df_map["crime_category"] = df_map["Primary Type"].astype(object).map(category_map)
+    return df_map
+
+
+def calculate_crime_rates(counts, time_column, group_column):
+    """
+    Crime rates of each category, and of all crimes, per time and place.
+
+    Args:
+        counts: The number of crimes ("count") per time_column,
+            group_column, neighborhood and crime_category.
+        time_column: The time column.
+        group_column: The geographical column.
+    Returns:
+        The crime rates.
+    """
+    keys = [time_column, group_column, "neighborhood"]
+
+    # Roll the categories up into "All Crimes", the categories being
+    # ordered as they appear
+    categories = [*pd.unique(counts["crime_category"].dropna()), "All Crimes"]
+    counts = pd.concat(
+        [counts, counts.assign(crime_category="All Crimes")], ignore_index=True
+    )
+    counts["crime_category"] = pd.Categorical(
+        counts["crime_category"], categories=categories
+    )
+
+    crime_rates = (
+        counts.groupby(["crime_category", *keys], observed=True)["count"]
+        .sum()
+        .reset_index(name="specific_count")
+    )
+    total_counts = (
+        counts.groupby([time_column, "crime_category"], observed=True)["count"]
+        .sum()
+        .rename("total_count")
+    )
+    crime_rates = crime_rates.join(total_counts, on=[time_column, "crime_category"])
+    crime_rates["crime_rate"] = (
+        crime_rates["specific_count"] / crime_rates["total_count"]
+    )
+    crime_rates["crime_category"] = crime_rates["crime_category"].astype(object)
+    return crime_rates[
+        [*keys, "specific_count", "crime_category", "total_count", "crime_rate"]
+    ]
+
+
+def write_crime_rates(counts, time_column, group_column):
+    """
+    Write the crime rates per time and place.
+
+    Args:
+        counts: The number of crimes per time_column, group_column,
+            neighborhood and crime_category.
+        time_column: The time column.
+        group_column: The geographical column.
+    """
+    if time_column in temporal.LABELS:
+        counts[time_column] = temporal.decode(time_column, counts[time_column])
+    calculate_crime_rates(counts, time_column, group_column).to_csv(
+        f"{paths.DATA_MAP_FOLDER}/{time_column}_{group_column}_crime_rates.csv",
+        index=False,
+    )
+
+
+# Aggregations by time and geographical level
+MAP_AGGREGATIONS = [
+    (time_column, group_column)
+    for time_column in ["hour", "weekday", "month", "year"]
+    for group_column in ["beat", "district"]
+]
+
+# Number of map aggregations written at once
+MAP_WORKERS = len(MAP_AGGREGATIONS)
+
+for _time_column, _group_column in MAP_AGGREGATIONS:
+    engine.register(
+        f"map_{_time_column}_{_group_column}",
+        "map",
+        keys=[_time_column, _group_column, "neighborhood", "crime_category"],
+        finalize=partial(
+            write_crime_rates, time_column=_time_column, group_column=_group_column
+        ),
+        outputs=[
+            f"{paths.DATA_MAP_FOLDER}/{_time_column}_{_group_column}_crime_rates.csv"
+        ],
+        # The totals count the crimes missing a place or a category too
+        dropna=False,
+    )
+
+
+def preprocess_map(path=paths.DATA_PATH):
+    """
+    Compute the crime rates of all the map aggregations from a single
+    pass over the crimes, each chunk being prepared once for all of them,
+    and write them concurrently.
+
+    Args:
+        path: The crimes file to read.
+    """
+    engine.run(
+        path,
+        columns=CRIME_COLUMNS,
+        prepare=prepare_chunk,
+        vizs=["map"],
+        workers=MAP_WORKERS,
+    )
+
+
+############################################
+# MAP BOUNDARIES
+############################################
+
+BOUNDARY_LEVELS = ["beat", "district"]
+
+
+def boundaries_path(level, resolution=None):
+    """
+    Path of the boundaries GeoJSON file of a geographical level.
+
+    Args:
+        level: The geographical level.
+        resolution: The simplified resolution, None for the full one.
+    Returns:
+        The file path.
+    """
+    suffix = "" if resolution is None else f"_{resolution}"
+    return f"{paths.DATA_MAP_FOLDER}/police_{level}s_boundaries{suffix}.geojson"
+
+
+def simplify_boundaries():
+    """
+    Write the boundaries of the geographical levels simplified at each
+    resolution of spatial.BOUNDARY_RESOLUTIONS.
+    """
+    for level in BOUNDARY_LEVELS:
+        with open(boundaries_path(level), encoding="utf-8") as f:
+            geojson = json.load(f)
+
+        for resolution, tolerance in spatial.BOUNDARY_RESOLUTIONS.items():
+            simplified = spatial.simplify_boundaries(geojson, tolerance)
+            with open(boundaries_path(level, resolution), "w", encoding="utf-8") as f:
+                json.dump(simplified, f, separators=(",", ":"))
+                f.write("\n")
+
+
+############################################
+# ALL VISUALIZATIONS
+############################################
+
+# Columns of the crimes files used by the aggregates
+CRIME_COLUMNS = [
+    "Date",
+    "Primary Type",
+    "Arrest",
+    "Beat",
+    "District",
+    "Latitude",
+    "Longitude",
 ]
 
-# Filter the columns to include only the specified ones
-df_filtered = df_map[columns_to_keep]
-
-# Convert to GeoDataFrame
-gdf = gpd.GeoDataFrame(df_filtered, geometry=gpd.points_from_xy(df_filtered.longitude, df_filtered.latitude), crs='EPSG:4326')
-
-def calculate_crime_rates(gdf, time_column, group_column):
-    results = []
-    crime_categories = gdf['crime_category'].unique()
-    total_counts = gdf.groupby([time_column, 'crime_category']).size().reset_index(name='total_count')
-
-    for category in crime_categories:
-        category_gdf = gdf[gdf['crime_category'] == category]
-        specific_counts = category_gdf.groupby([time_column, group_column, 'neighborhood']).size().reset_index(name='specific_count')
-        crime_rates = pd.merge(specific_counts, total_counts[total_counts['crime_category'] == category], on=[time_column], how='left')
-        crime_rates['specific_count'] = crime_rates['specific_count'].fillna(0)
-        crime_rates['crime_rate'] = crime_rates['specific_count'] / crime_rates['total_count']
-        crime_rates['crime_category'] = category
-        results.append(crime_rates)
-
-    final_result = pd.concat(results, ignore_index=True)
-    overall_counts = gdf.groupby([time_column, group_column, 'neighborhood']).size().reset_index(name='specific_count')
-    overall_total_counts = gdf.groupby([time_column]).size().reset_index(name='total_count')
-    overall_counts = pd.merge(overall_counts, overall_total_counts, on=[time_column], how='left')
-    overall_counts['crime_rate'] = overall_counts['specific_count'] / overall_counts['total_count']
-    overall_counts['crime_category'] = 'All Crimes'
-    
-    final_result = pd.concat([final_result, overall_counts], ignore_index=True)
-    return final_result
-
-# Aggregation by day of the week and beat
-daily_beat_agg = calculate_crime_rates(gdf, 'day_of_week', 'beat')
-daily_district_agg = calculate_crime_rates(gdf, 'day_of_week', 'district')
-monthly_beat_agg = calculate_crime_rates(gdf, 'month', 'beat')
-monthly_district_agg = calculate_crime_rates(gdf, 'month', 'district')
-hourly_beat_agg = calculate_crime_rates(gdf, 'hour', 'beat')
-hourly_district_agg = calculate_crime_rates(gdf, 'hour', 'district')
-yearly_beat_agg = calculate_crime_rates(gdf, 'year', 'beat')
-yearly_district_agg = calculate_crime_rates(gdf, 'year', 'district')
-
-# Save the aggregated data to CSV files
-daily_beat_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/daily_beat_crime_rates.csv", index=False)
-daily_district_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/daily_district_crime_rates.csv", index=False)
-monthly_beat_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/monthly_beat_crime_rates.csv", index=False)
-monthly_district_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/monthly_district_crime_rates.csv", index=False)
-hourly_beat_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/hourly_beat_crime_rates.csv", index=False)
-monthly_district_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/hourly_district_crime_rates.csv", index=False)
-yearly_beat_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/yearly_beat_crime_rates.csv", index=False)
-yearly_district_agg.to_csv(f"{paths.DATA_MAP_FOLDER}/yearly_district_crime_rates.csv", index=False)
+
+def prepare_chunk(chunk):
+    """
+    Add the columns derived from the crimes used by the aggregates.
+
+    Args:
+        chunk: The chunk, with the CRIME_COLUMNS columns.
+    Returns:
+        The prepared chunk.
+    """
+    chunk = temporal.add_temporal_features(chunk)
+    return prepare_map_chunk(chunk)
+
+
+def preprocess_all(path=paths.DATA_PATH, vizs=None):
+    """
+    Compute the data of the visualizations from a single pass
+    over the crimes.
+
+    When all the visualizations are processed, the state needed
+    to refresh them incrementally is persisted too.
+
+    Args:
+        path: The crimes file to read.
+        vizs: The visualizations to process, all of them if None.
+    """
+    if vizs is None:
+        results = incremental.build(path, CRIME_COLUMNS, prepare_chunk)
+        engine.finalize(engine.select(), results)
+    else:
+        engine.run(path, columns=CRIME_COLUMNS, prepare=prepare_chunk, vizs=vizs)
+
+
+def refresh_all(path=paths.DATA_PATH):
+    """
+    Update the data of the visualizations with the crimes
+    updated since the last build.
+
+    Args:
+        path: The crimes file to read.
+    Returns:
+        The number of records applied.
+    """
+    return incremental.refresh(path, CRIME_COLUMNS, prepare_chunk)
+
+
+############################################
+# PIPELINE
+############################################
+
+# Number of aggregates of each visualization written at once
+VIZ_WORKERS = {"map": MAP_WORKERS}
+
+# Code of the files of each visualization, besides its finalize functions
+VIZ_CODE = {
+    "multiline": [process_multiline, CountCube],
+    "histogram": [write_histogram, temporal],
+    "cluster": [
+        arrest_matrix,
+        preprocess_year,
+        load_layout,
+        preprocess_years,
+        _preprocess_worker_year,
+        embedding,
+    ],
+    "stacked_bar_chart": [write_arrest_rates],
+    "map": [calculate_crime_rates, write_crime_rates, temporal],
+}
+
+
+def finalize_viz(viz):
+    """
+    Write the files of a visualization from the persisted aggregates.
+
+    Args:
+        viz: The visualization.
+    """
+    aggregates = engine.select([viz])
+    engine.finalize(
+        aggregates,
+        {aggregate.name: engine.load_state(aggregate) for aggregate in aggregates},
+        workers=VIZ_WORKERS.get(viz, 1),
+    )
+
+
+def preprocessing_stages(path=paths.DATA_PATH):
+    """
+    Stages computing the files of the visualizations from a crimes file:
+    its columnar conversion, the scan filling the persisted aggregates,
+    one stage per visualization writing its files from them and the
+    simplification of the map boundaries.
+
+    Args:
+        path: The crimes CSV file.
+    Returns:
+        The list of stages.
+    """
+    aggregates = engine.select()
+    viz_settings = {"histogram": TIME_ORDERS, "cluster": CLUSTER_EMBEDDING}
+    stages = [
+        pipeline.Stage(
+            "columnar",
+            partial(ingest.convert_to_columnar, path),
+            inputs=[path],
+            outputs=[ingest.columnar_path(path)],
+            code=[ingest, schema],
+        ),
+        pipeline.Stage(
+            "scan",
+            partial(incremental.build, path, CRIME_COLUMNS, prepare_chunk),
+            inputs=[
+                ingest.columnar_path(path),
+                paths.DATA_BEAT_BOUNDARY_VIEW_PATH,
+                paths.DATA_BEATS_BOUNDARIES_PATH,
+                paths.DATA_DISTRICT_NEIGHBORHOODS_PATH,
+            ],
+            outputs=[engine.state_path(aggregate) for aggregate in aggregates]
+            + [incremental.RECORDS_FOLDER, incremental.WATERMARK_PATH],
+            code=[
+                ingest,
+                schema,
+                engine,
+                incremental,
+                temporal,
+                spatial,
+                prepare_chunk,
+                prepare_map_chunk,
+                determine_district_from_beat,
+            ],
+            params={
+                "columns": CRIME_COLUMNS,
+                "categories": category_map,
+                "aggregates": {
+                    aggregate.name: [aggregate.keys, aggregate.measures]
+                    for aggregate in aggregates
+                },
+            },
+        ),
+    ]
+
+    stages.append(
+        pipeline.Stage(
+            "boundaries",
+            simplify_boundaries,
+            inputs=[boundaries_path(level) for level in BOUNDARY_LEVELS],
+            outputs=[
+                boundaries_path(level, resolution)
+                for level in BOUNDARY_LEVELS
+                for resolution in spatial.BOUNDARY_RESOLUTIONS
+            ],
+            code=[boundaries_path, simplify_boundaries, spatial.simplify_boundaries],
+            params=[spatial.BOUNDARY_RESOLUTIONS, spatial.BOUNDARY_PRECISION],
+        )
+    )
+
+    for viz, code in VIZ_CODE.items():
+        viz_aggregates = engine.select([viz])
+        stages.append(
+            pipeline.Stage(
+                viz,
+                partial(finalize_viz, viz),
+                inputs=[engine.state_path(aggregate) for aggregate in viz_aggregates],
+                outputs=[
+                    output
+                    for aggregate in viz_aggregates
+                    for output in aggregate.outputs
+                ],
+                code=[
+                    getattr(aggregate.finalize, "func", aggregate.finalize)
+                    for aggregate in viz_aggregates
+                ]
+                + code,
+                params={
+                    "finalize": [
+                        getattr(aggregate.finalize, "keywords", None)
+                        for aggregate in viz_aggregates
+                    ],
+                    "settings": viz_settings.get(viz),
+                },
+            )
+        )
+    return stages
+
+
+def dataset_stages():
+    """
+    Stages deriving the reduced dataset from the full one,
+    and its columnar conversion.
+
+    Returns:
+        The list of stages.
+    """
+    return [
+        pipeline.Stage(
+            "reduce",
+            partial(
+                reduce_data,
+                fraction=REDUCED_FRACTION,
+                size=REDUCED_SIZE,
+                strata=REDUCED_STRATA,
+                seed=REDUCED_SEED,
+            ),
+            inputs=[paths.DATA_PATH],
+            outputs=[paths.DATA_REDUCED_PATH],
+            code=[write_reduced, reduce_data, sampling],
+            params=[REDUCED_FRACTION, REDUCED_SIZE, REDUCED_STRATA, REDUCED_SEED],
+        ),
+        pipeline.Stage(
+            "columnar_reduced",
+            partial(ingest.convert_to_columnar, paths.DATA_REDUCED_PATH),
+            inputs=[paths.DATA_REDUCED_PATH],
+            outputs=[ingest.columnar_path(paths.DATA_REDUCED_PATH)],
+            code=[ingest, schema],
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help='only apply the crimes updated since the last build ("Updated On")',
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=CLUSTER_WORKERS,
+        help="number of processes clustering the years, 0 for all the cores",
+    )
+    parser.add_argument(
+        "--embedding",
+        choices=embedding.EMBEDDINGS,
+        default=CLUSTER_EMBEDDING,
+        help="embedding of the beats of the cluster plot",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="run all the stages, even those whose outputs are up to date",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=REDUCED_SIZE,
+        help="number of crimes of the reduced dataset, instead of a fraction",
+    )
+    parser.add_argument(
+        "--strata",
+        nargs="+",
+        default=REDUCED_STRATA,
+        choices=["year", "Beat", "District", "Primary Type"],
+        help="columns stratifying the reduced dataset of a given size",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=REDUCED_SEED,
+        help="seed of the sampling of the reduced dataset",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        metavar="STAGE",
+        choices=[
+            "reduce",
+            "columnar_reduced",
+            "columnar",
+            "scan",
+            "boundaries",
+            *VIZ_CODE,
+        ],
+        help="stages to bring up to date, with the stages they depend on"
+        ' (e.g. "--only map" to build the map data)',
+    )
+    args = parser.parse_args()
+    CLUSTER_WORKERS = args.workers
+    CLUSTER_EMBEDDING = args.embedding
+    REDUCED_SIZE = args.sample_size
+    REDUCED_STRATA = args.strata
+    REDUCED_SEED = args.seed
+
+    if args.refresh:
+        applied = refresh_all()
+        print(f"Records refreshed: {applied or 'none, nothing to do'}")
+    else:
+        # Only the stages whose code or inputs changed are run
+        executed = pipeline.run(
+            dataset_stages() + preprocessing_stages(),
+            force=args.force,
+            targets=args.only,
+        )
+        print(f"Stages run: {', '.join(executed) or 'none, all up to date'}")
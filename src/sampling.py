@@ -0,0 +1,117 @@
+"""
+One-pass sampling of the crimes dataset.
+
+Every crime gets a random key as it is read and the sample is made of
+the crimes with the smallest keys, which is a uniform sample without
+replacement. Only the crimes that can still be part of the sample are
+kept between chunks, so that memory depends on the sample size and not
+on the size of the dataset. A stratified sample takes a first pass
+counting the crimes of each stratum, so that only the share of the
+sample of each stratum is kept during the sampling pass.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Helper columns of the sampled crimes
+KEY = "_key"
+ROW = "_row"
+
+
+class ReservoirSampler:
+    """
+    Fixed-size sample of the rows of chunks, optionally stratified.
+
+    A stratified sample is allocated to the strata in proportion to their
+    number of rows (largest remainder), counted by a first pass over the
+    chunks with count, before the sampling pass with update. Only the
+    allocated rows of each stratum are kept, at most size rows in all.
+    """
+
+    def __init__(self, size, strata=(), seed=None):
+        """
+        Args:
+            size: The number of rows of the sample.
+            strata: The columns defining the strata, none for a simple sample.
+            seed: The seed of the random keys.
+        """
+        self.size = size
+        self.strata = list(strata)
+        self.rng = np.random.default_rng(seed)
+        self.sample = None
+        self.counts = None
+        self.quotas = None
+        self.rows = 0
+
+    def stratum_ranks(self, rows):
+        # Rows are sorted by key, the first ones of a stratum are sampled
+        return rows.groupby(self.strata, dropna=False, observed=True).cumcount()
+
+    def count(self, chunk):
+        """
+        Count the rows of each stratum of a chunk, in the first pass of a
+        stratified sample.
+
+        Args:
+            chunk: The DataFrame, with the strata columns.
+        """
+        counts = chunk[self.strata].value_counts(dropna=False)
+        self.counts = (
+            counts if self.counts is None else self.counts.add(counts, fill_value=0)
+        )
+
+    def update(self, chunk):
+        """
+        Add the rows of a chunk to the candidates of the sample, all the
+        chunks having been counted first for a stratified sample.
+
+        Args:
+            chunk: The DataFrame, with the strata columns.
+        """
+        if self.strata and self.quotas is None:
+            if self.counts is None:
+                raise ValueError("The strata must be counted before sampling")
+            self.quotas = self.allocation()
+
+        chunk = chunk.assign(
+            **{
+                KEY: self.rng.random(len(chunk)),
+                ROW: np.arange(self.rows, self.rows + len(chunk)),
+            }
+        )
+        self.rows += len(chunk)
+
+        rows = chunk if self.sample is None else pd.concat([self.sample, chunk])
+        rows = rows.sort_values(KEY)
+        if self.strata:
+            quotas = rows.join(self.quotas, on=self.strata)["_allocation"]
+            ranks = self.stratum_ranks(rows)
+            rows = rows[ranks.to_numpy() < quotas.fillna(0).to_numpy()]
+        else:
+            rows = rows.head(self.size)
+        self.sample = rows
+
+    def allocation(self):
+        """
+        Number of sampled rows of each stratum.
+
+        Returns:
+            A Series indexed by the strata values.
+        """
+        quotas = self.counts * self.size / self.counts.sum()
+        allocation = np.floor(quotas).astype(int)
+        remainder = self.size - allocation.sum()
+        largest = (quotas - allocation).sort_values(ascending=False, kind="stable")
+        allocation.loc[largest.index[:remainder]] += 1
+        return allocation.rename("_allocation")
+
+    def result(self):
+        """
+        Sample of the rows seen so far.
+
+        Returns:
+            The DataFrame, in the order the rows were seen.
+        """
+        if self.sample is None:
+            return pd.DataFrame()
+        return self.sample.sort_values(ROW).drop(columns=[KEY, ROW])
@@ -0,0 +1,139 @@
+"""
+Typed schema of the crimes records.
+
+Every loader of the crimes converts the columns it loads to these types:
+small integers for the identifiers and codes, categoricals for the
+repeated labels, booleans for the flags and single precision floats for
+the coordinates. The dates are parsed into timestamps.
+
+Run as a script to report the memory of a crimes file per record,
+as read without types and with them.
+"""
+
+import argparse
+
+import pandas as pd
+
+DATE_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+DATE_COLUMNS = ["Date", "Updated On"]
+
+# Types of the columns, the dates being timestamps and the other columns
+# ("Case Number", "Block" and "Location") strings
+COLUMN_TYPES = {
+    "ID": "int32",
+    "IUCR": "category",
+    "Primary Type": "category",
+    "Description": "category",
+    "Location Description": "category",
+    "Arrest": "bool",
+    "Domestic": "bool",
+    "Beat": "int16",
+    "District": "Int8",
+    "Ward": "Int8",
+    "Community Area": "Int8",
+    "FBI Code": "category",
+    "X Coordinate": "float32",
+    "Y Coordinate": "float32",
+    "Year": "int16",
+    "Latitude": "float32",
+    "Longitude": "float32",
+}
+
+# Columns stored dictionary-encoded, read back as categoricals
+CATEGORY_COLUMNS = [
+    column for column, dtype in COLUMN_TYPES.items() if dtype == "category"
+]
+
+# Types given to the CSV parser, the other columns being converted after it
+PARSER_TYPES = {
+    column: dtype
+    for column, dtype in COLUMN_TYPES.items()
+    if dtype in ("category", "float32")
+}
+
+
+def parser_types(columns=None):
+    """
+    Types of the columns the CSV parser can produce directly.
+
+    Args:
+        columns: The loaded columns, all of them if None.
+    Returns:
+        The dict of types by column.
+    """
+    return {
+        column: dtype
+        for column, dtype in PARSER_TYPES.items()
+        if columns is None or column in columns
+    }
+
+
+def apply_types(chunk):
+    """
+    Convert the columns of a chunk of crimes to their typed representation.
+
+    Args:
+        chunk: The DataFrame, read from a CSV or columnar file.
+    Returns:
+        The typed DataFrame.
+    """
+    for column in DATE_COLUMNS:
+        if column in chunk and not pd.api.types.is_datetime64_any_dtype(chunk[column]):
+            chunk[column] = pd.to_datetime(chunk[column], format=DATE_FORMAT)
+    for column, dtype in COLUMN_TYPES.items():
+        if column in chunk and chunk[column].dtype != dtype:
+            chunk[column] = chunk[column].astype(dtype)
+    for column in CATEGORY_COLUMNS:
+        # Dictionaries are in order of appearance, sort them as from a CSV
+        if column in chunk:
+            categories = chunk[column].cat.categories
+            if not categories.is_monotonic_increasing:
+                chunk[column] = chunk[column].cat.reorder_categories(
+                    categories.sort_values()
+                )
+    return chunk
+
+
+def bytes_per_row(frame):
+    """
+    Memory of a DataFrame per row, the strings included.
+
+    Args:
+        frame: The DataFrame.
+    Returns:
+        The number of bytes.
+    """
+    return frame.memory_usage(deep=True, index=False).sum() / max(len(frame), 1)
+
+
+def memory_report(path, columns=None):
+    """
+    Memory per record of a crimes CSV file, read without and with types.
+
+    Args:
+        path: The CSV file.
+        columns: The loaded columns, all of them if None.
+    Returns:
+        A DataFrame with the bytes per row of each column, and of the
+        whole record, untyped and typed.
+    """
+    untyped = pd.read_csv(path, usecols=columns)
+    typed = apply_types(pd.read_csv(path, usecols=columns, dtype=parser_types(columns)))
+    report = pd.DataFrame(
+        {
+            "untyped": untyped.memory_usage(deep=True, index=False) / len(untyped),
+            "typed": typed.memory_usage(deep=True, index=False) / len(typed),
+        }
+    )
+    report.loc["total"] = [bytes_per_row(untyped), bytes_per_row(typed)]
+    return report.round(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="crimes CSV file")
+    parser.add_argument("--columns", nargs="+", help="loaded columns")
+    args = parser.parse_args()
+
+    print(memory_report(args.path, args.columns).to_string())
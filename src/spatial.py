@@ -0,0 +1,146 @@
+"""
+Spatial processing of the crimes and of the police boundaries.
+
+The beats polygons are indexed once in an R-tree (STRtree), in which the
+crimes are then located from their coordinates, a whole chunk at once.
+Unlike the reported beat, this stays right for the crimes whose beat was
+renumbered since. The index is cached on disk, and reused as long as
+its GeoJSON file is unchanged.
+
+The boundaries drawn on the map are also simplified at several
+resolutions, to lighten the figures.
+"""
+
+import json
+import os
+import pickle
+from functools import cache
+
+import numpy as np
+import shapely
+
+import paths as paths
+
+BEAT_INDEX_PATH = f"{paths.DATA_CACHE_FOLDER}/beat_index.pickle"
+
+# Simplification tolerance of the boundaries at each resolution, in degrees
+BOUNDARY_RESOLUTIONS = {"high": 1e-4, "medium": 3e-4, "low": 1e-3}
+
+# Decimals of the simplified coordinates, about a meter
+BOUNDARY_PRECISION = 5
+
+
+class BeatIndex:
+    """
+    R-tree of the beats polygons, with their beat and district.
+    """
+
+    def __init__(self, tree, beats, districts):
+        self.tree = tree
+        self.beats = np.asarray(beats, dtype=object)
+        self.districts = np.asarray(districts, dtype=float)
+
+    @classmethod
+    def from_geojson(cls, path):
+        """
+        Build the index of a beats GeoJSON file.
+
+        Args:
+            path: The GeoJSON file, with the "beat_num" and "district"
+                properties.
+        Returns:
+            The BeatIndex.
+        """
+        with open(path, encoding="utf-8") as f:
+            features = json.load(f)["features"]
+
+        polygons = [shapely.geometry.shape(feature["geometry"]) for feature in features]
+        return cls(
+            shapely.STRtree(polygons),
+            # Beats without leading zeros, as the reported ones
+            [str(int(feature["properties"]["beat_num"])) for feature in features],
+            [int(feature["properties"]["district"]) for feature in features],
+        )
+
+    def locate(self, longitudes, latitudes):
+        """
+        Beat and district of points.
+
+        Args:
+            longitudes: The longitudes of the points.
+            latitudes: The latitudes of the points.
+        Returns:
+            The array of beats, None outside of the beats, and the array
+            of districts, NaN outside of the beats.
+        """
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        beats = np.full(len(longitudes), None, dtype=object)
+        districts = np.full(len(longitudes), np.nan)
+
+        located = np.flatnonzero(~(np.isnan(longitudes) | np.isnan(latitudes)))
+        points = shapely.points(longitudes[located], latitudes[located])
+        point_indices, polygon_indices = self.tree.query(points, predicate="within")
+
+        # A point on a shared boundary gets the first of its polygons
+        point_indices, first = np.unique(point_indices, return_index=True)
+        polygon_indices = polygon_indices[first]
+        beats[located[point_indices]] = self.beats[polygon_indices]
+        districts[located[point_indices]] = self.districts[polygon_indices]
+        return beats, districts
+
+
+@cache
+def load_beat_index():
+    """
+    Index of the beats, read from its cache if it is up to date,
+    built and cached otherwise.
+
+    Returns:
+        The BeatIndex.
+    """
+    path = paths.DATA_BEATS_BOUNDARIES_PATH
+    if os.path.exists(BEAT_INDEX_PATH) and os.path.getmtime(
+        BEAT_INDEX_PATH
+    ) >= os.path.getmtime(path):
+        with open(BEAT_INDEX_PATH, "rb") as f:
+            return pickle.load(f)
+
+    index = BeatIndex.from_geojson(path)
+    os.makedirs(paths.DATA_CACHE_FOLDER, exist_ok=True)
+    with open(BEAT_INDEX_PATH, "wb") as f:
+        pickle.dump(index, f)
+    return index
+
+
+def simplify_boundaries(geojson, tolerance, precision=BOUNDARY_PRECISION):
+    """
+    Simplify the polygons of a boundaries GeoJSON, as a coverage: the
+    boundaries shared by neighbor polygons are simplified once, so that
+    no gap or overlap appears between them.
+
+    Args:
+        geojson: The GeoJSON dict of polygons covering the city.
+        tolerance: The simplification tolerance, in degrees.
+        precision: The number of decimals the coordinates are rounded to.
+    Returns:
+        The simplified GeoJSON dict, with the same properties.
+    """
+    polygons = np.array(
+        [shapely.geometry.shape(feature["geometry"]) for feature in geojson["features"]]
+    )
+    simplified = shapely.coverage_simplify(polygons, tolerance)
+    simplified = shapely.transform(
+        simplified, lambda coordinates: np.round(coordinates, precision)
+    )
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": feature["properties"],
+                "geometry": shapely.geometry.mapping(polygon),
+            }
+            for feature, polygon in zip(geojson["features"], simplified)
+        ],
+    }
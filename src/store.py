@@ -0,0 +1,112 @@
+"""
+Read-only tables shared by the processes of the app.
+
+The tables read by the visualizations are materialized once into Arrow
+files, which every process then memory-maps: the columns of the tables
+are views of the mapped files, shared by all the gunicorn workers through
+the page cache instead of being copied in each of them. A table is
+materialized again when its CSV file or the code preparing it changes.
+"""
+
+import hashlib
+import inspect
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+import paths as paths
+
+STORE_FOLDER = f"{paths.DATA_CACHE_FOLDER}/store"
+
+# Schema metadata of the materialized tables, identifying their source
+KEY_METADATA = b"store_key"
+
+
+def store_path(path):
+    """
+    Arrow file of a CSV file of the data folder.
+
+    Args:
+        path: The CSV file.
+    Returns:
+        The path of the Arrow file, in the same subfolder of the store.
+    """
+    relative = os.path.relpath(os.path.splitext(path)[0], paths.DATA_FOLDER)
+    return f"{STORE_FOLDER}/{relative}.arrow"
+
+
+def source_key(path, prepare):
+    """
+    Key of the source of a table, changing with the CSV file or the code
+    preparing it.
+
+    Args:
+        path: The CSV file.
+        prepare: The function preparing the table, or None.
+    Returns:
+        The key, as bytes.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    if prepare is not None:
+        digest.update(inspect.getsource(prepare).encode())
+    return digest.hexdigest().encode()
+
+
+def read_key(path):
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(KEY_METADATA)
+
+
+def materialize(path, prepare, target, key):
+    frame = pd.read_csv(path)
+    if prepare is not None:
+        frame = prepare(frame)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), KEY_METADATA: key}
+    )
+
+    # Written aside then renamed, for the processes materializing it at once
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    with pa.OSFile(temporary, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary, target)
+
+
+def string_type(arrow_type):
+    # Arrow-backed strings on every pandas version, instead of objects
+    # copied in each process where str is not backed by Arrow by default
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def shared_csv(path, prepare=None):
+    """
+    Table of a CSV file, read from its memory-mapped Arrow file, which is
+    materialized first if missing or outdated.
+
+    Args:
+        path: The CSV file, in the data folder.
+        prepare: The function called with the DataFrame read from the CSV
+            file and returning the table to materialize, None to
+            materialize it as read.
+    Returns:
+        The DataFrame, whose numeric columns are read-only views of the
+        mapped file and whose string columns are backed by Arrow.
+    """
+    target = store_path(path)
+    key = source_key(path, prepare)
+    if read_key(target) != key:
+        materialize(path, prepare, target, key)
+
+    # The mapping is kept alive by the buffers of the table
+    table = pa.ipc.open_file(pa.memory_map(target)).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=string_type)
@@ -0,0 +1,91 @@
+"""
+Temporal features of the crimes.
+
+The "Date" column is parsed once and every feature is derived from it
+with vectorized operations, as an integer code. The codes of the
+weekday, month and time of day features index the label lists below.
+"""
+
+import numpy as np
+import pandas as pd
+
+from schema import DATE_FORMAT
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+MONTHS = [
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+]
+
+# Periods of 6 hours starting at midnight
+TIMES_OF_DAY = ["Night", "Morning", "Afternoon", "Evening"]
+
+LABELS = {
+    "weekday": WEEKDAYS,
+    "month": MONTHS,
+    "time_of_day": TIMES_OF_DAY,
+}
+
+FEATURES = ["year", "month", "weekday", "hour", "time_of_day"]
+
+
+def add_temporal_features(chunk, features=None, column="Date"):
+    """
+    Add integer-coded temporal features derived from a date column.
+
+    Args:
+        chunk: The DataFrame holding the date column.
+        features: The features to add, among FEATURES, all of them if None.
+        column: The date column, parsed if it holds strings.
+    Returns:
+        The DataFrame with one column per feature.
+    """
+    if features is None:
+        features = FEATURES
+
+    dates = chunk[column]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format=DATE_FORMAT)
+
+    codes = {
+        "year": lambda: dates.dt.year.to_numpy(dtype=np.int16),
+        "month": lambda: dates.dt.month.to_numpy(dtype=np.int8) - 1,
+        "weekday": lambda: dates.dt.dayofweek.to_numpy(dtype=np.int8),
+        "hour": lambda: dates.dt.hour.to_numpy(dtype=np.int8),
+        "time_of_day": lambda: dates.dt.hour.to_numpy(dtype=np.int8) // 6,
+    }
+    for feature in features:
+        chunk[feature] = codes[feature]()
+    return chunk
+
+
+def decode(feature, values):
+    """
+    Labels of integer-coded feature values.
+
+    Args:
+        feature: The feature, one of LABELS keys.
+        values: The codes.
+    Returns:
+        A numpy array of labels.
+    """
+    return np.asarray(LABELS[feature], dtype=object)[np.asarray(values, dtype=int)]
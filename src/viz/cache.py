@@ -0,0 +1,154 @@
+"""
+Cache of the figures of the visualizations.
+
+The figures of the callbacks only depend on a few inputs with a small
+set of values, so they are built and serialized once per inputs, then
+served from memory. The figures are kept serialized, as compact JSON,
+and decoded on use, since the callbacks patch them and Dash serializes
+its responses itself. The cache is bounded by the size of the kept
+figures, evicting the least recently used ones first, and is emptied
+when the preprocessed data is built again, the data of the
+visualizations being loaded again too.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import plotly.io as pio
+
+from paths import DATA_MANIFEST_PATH, DATA_WATERMARK_PATH
+from viz import registry
+
+# Maximum size of the serialized figures kept in memory
+MAX_BYTES = 64 * 1024 * 1024
+
+# Files written by the builds and refreshes of the preprocessed data
+BUILD_PATHS = [DATA_MANIFEST_PATH, DATA_WATERMARK_PATH]
+
+
+def build_version():
+    """
+    Version of the preprocessed data.
+
+    Returns:
+        The modification times of the files written by the builds,
+        None for the missing ones.
+    """
+    return tuple(
+        os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        for path in BUILD_PATHS
+    )
+
+
+class FigureCache:
+    """
+    Size-bounded least recently used cache of serialized figures.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.version = build_version()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def invalidate(self, version):
+        """
+        Empty the cache for a new version of the preprocessed data.
+
+        Args:
+            version: The new build_version.
+        """
+        # Reset first, for the figures built from now on to use the new data
+        registry.reset_all()
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.version = version
+
+    def get(self, key):
+        """
+        Cached figure of a key.
+
+        Args:
+            key: The key.
+        Returns:
+            The figure as a JSON-compatible dict, None if not cached.
+        """
+        version = build_version()
+        if version != self.version:
+            self.invalidate(version)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            serialized = self.entries[key]
+        return json.loads(serialized)
+
+    def put(self, key, figure):
+        """
+        Serialize and cache a figure.
+
+        Args:
+            key: The key.
+            figure: The plotly figure.
+        Returns:
+            The figure as a JSON-compatible dict.
+        """
+        # Kept serialized, the bound being the size of what is kept
+        serialized = pio.to_json(figure, validate=False).encode()
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= len(self.entries.pop(key))
+            if len(serialized) <= self.max_bytes:
+                self.entries[key] = serialized
+                self.bytes += len(serialized)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+        return json.loads(serialized)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
+
+
+FIGURES = FigureCache()
+
+
+def cached_figure(create):
+    """
+    Decorator caching the figures of a function by its arguments.
+
+    Args:
+        create: The function returning a plotly figure,
+            with hashable arguments.
+    Returns:
+        The function returning the figure as a JSON-compatible dict.
+    """
+
+    @wraps(create)
+    def wrapper(*args, **kwargs):
+        key = (create.__module__, create.__qualname__, args, tuple(kwargs.items()))
+        figure = FIGURES.get(key)
+        if figure is None:
+            figure = FIGURES.put(key, create(*args, **kwargs))
+        return figure
+
+    return wrapper
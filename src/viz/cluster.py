@@ -1,18 +1,45 @@
-import pandas as pd
 import plotly.express as px
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
 import paths as paths
+from store import shared_csv
+from viz.cache import cached_figure
+from viz.patch import figure_patch
+from viz.registry import lazy_data
 
 # FIXME slider ugly
 
 
-def get_html(figure):
-    # read min and max years
+def read_min_max_years():
     with open(f"{paths.DATA_CLUSTER_FOLDER}/min_max_years", "r", encoding="utf-8") as f:
-        min_year = int(f.readline())
-        max_year = int(f.readline())
+        return int(f.readline()), int(f.readline())
+
+
+def prepare_year(clusters):
+    return clusters.astype({"cluster": "int8", "Beat": "int16"})
+
+
+def read_year(year):
+    return shared_csv(f"{paths.DATA_CLUSTER_FOLDER}/cluster_{year}.csv", prepare_year)
+
+
+MIN_YEAR, MAX_YEAR = read_min_max_years()
+
+
+@lazy_data
+def load_clusters():
+    """
+    Clustered beats of every year, loaded once.
+
+    Returns:
+        The dict of DataFrames by year.
+    """
+    return {year: read_year(year) for year in range(MIN_YEAR, MAX_YEAR + 1)}
+
+
+def get_html(figure):
+    min_year, max_year = MIN_YEAR, MAX_YEAR
 
     return html.Div(
         className="cluster-plot-container",
@@ -53,8 +80,9 @@ def get_html(figure):
     )
 
 
+@cached_figure
 def create_figure(selected_year):
-    tsne_df = pd.read_csv(f"{paths.DATA_CLUSTER_FOLDER}/cluster_{selected_year}.csv")
+    tsne_df = load_clusters()[selected_year]
 
     # Create the plot
     fig = px.scatter(
@@ -82,7 +110,7 @@ def create_figure(selected_year):
     return fig
 
 
-def get_figure(data):
+def get_figure(_data):
     """
     Returns a plotly figure object
 
@@ -91,7 +119,7 @@ def get_figure(data):
     Returns:
         The figure to be displayed.
     """
-    return create_figure(data["Year"].min())
+    return create_figure(MIN_YEAR)
 
 
 def get_hover_template():
@@ -108,4 +136,8 @@ def get_callbacks(app):
     # Callback to update the plot based on the selected year
     @app.callback(Output("cluster-plot", "figure"), [Input("year-slider", "value")])
     def update_figure_callback(selected_year):
-        return create_figure(selected_year)
+        return figure_patch(
+            create_figure(selected_year),
+            data=["x", "y", "customdata", "marker.color"],
+            layout=["title.text"],
+        )
@@ -10,6 +10,10 @@ from dash import dcc, html
 from dash.dependencies import Input, Output
 
 from paths import DATA_HISTOGRAM_FOLDER
+from store import shared_csv
+from viz.cache import cached_figure
+from viz.patch import figure_patch
+from viz.registry import lazy_data
 
 
 class TimeFilter:
@@ -18,7 +22,12 @@ class TimeFilter:
     """
 
     def __init__(self, name):
-        self.csv = pd.read_csv(f"{DATA_HISTOGRAM_FOLDER}/histogram_{name}.csv")
+        self.name = name
+        self.path = f"{DATA_HISTOGRAM_FOLDER}/histogram_{name}.csv"
+
+    @property
+    def csv(self):
+        return load_histograms()[self.name]
 
 
 class TimeFilters(Enum):
@@ -31,6 +40,14 @@ class TimeFilters(Enum):
     MONTH = TimeFilter("month")
 
 
+@lazy_data
+def load_histograms():
+    return {
+        time_filter.value.name: shared_csv(time_filter.value.path)
+        for time_filter in TimeFilters
+    }
+
+
 def time_filters_from_name(name) -> TimeFilters:
     name = name.lower()
     if name == "time_of_day":
@@ -45,12 +62,13 @@ def time_filters_from_name(name) -> TimeFilters:
 
 CRIME_TYPES = [
     ct
-    for ct in TimeFilters.TIME_OF_DAY.value.csv.columns[1:]
+    for ct in pd.read_csv(TimeFilters.TIME_OF_DAY.value.path, nrows=0).columns[1:]
     if ct not in ["NON-CRIMINAL", "NON-CRIMINAL (SUBJECT SPECIFIED)", "NON - CRIMINAL"]
 ]
 DEFAULT_CRIME_TYPE = "Total"
 
 
+@cached_figure
 def create_histogram(time_filter: TimeFilters, crime_type):
     # Create the figure
     fig = go.Figure()
@@ -161,4 +179,8 @@ def get_callbacks(app):
     )
     def histogram_callback(time_filter, crime_type):
         time_filter = time_filters_from_name(time_filter)
-        return create_histogram(time_filter, crime_type)
+        return figure_patch(
+            create_histogram(time_filter, crime_type),
+            data=["x", "y"],
+            layout=["xaxis.title", "yaxis.title"],
+        )
@@ -2,17 +2,23 @@
 Map visualization.
 """
 
+import hashlib
 import json
+import os
 from enum import Enum
 
 import dash
+import flask
 import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
 from paths import DATA_MAP_FOLDER
-
+from store import shared_csv
+from viz.cache import cached_figure
+from viz.patch import figure_patch
+from viz.registry import lazy_data
 
 
 class GeoLevel(Enum):
@@ -23,11 +29,12 @@ class GeoLevel(Enum):
     DISTRICT = "district"
     BEAT = "beat"
 
-    def read_boundaries(self):
-        with open(
-            f"{DATA_MAP_FOLDER}/police_{self.value}s_boundaries.geojson",
-            encoding="utf-8",
-        ) as f:
+    def boundaries_path(self, resolution="full"):
+        suffix = "" if resolution == "full" else f"_{resolution}"
+        return f"{DATA_MAP_FOLDER}/police_{self.value}s_boundaries{suffix}.geojson"
+
+    def read_boundaries(self, resolution="full"):
+        with open(self.boundaries_path(resolution), encoding="utf-8") as f:
             return json.load(f)
 
     @staticmethod
@@ -67,30 +74,126 @@ class DataAggregation:
     Data aggregation of crime rates by geolevel and time_filter.
     """
 
-    def _path(self):
-        return f"{DATA_MAP_FOLDER}/{self.time_filter.value}_{self.geolevel.value}_crime_rates.csv"
+    @staticmethod
+    def path(geolevel: GeoLevel, time_filter: TimeFilter):
+        return f"{DATA_MAP_FOLDER}/{time_filter.value}_{geolevel.value}_crime_rates.csv"
+
+    @staticmethod
+    def prepare(rates):
+        """
+        Prepare the crime rates of a CSV file for the figures, sorted by
+        time value and crime category.
+
+        Args:
+            rates: The DataFrame, the time value being its first column.
+        Returns:
+            The prepared DataFrame.
+        """
+        if "beat" in rates:
+            rates["beat"] = rates["beat"].apply(lambda x: str(x).zfill(4))
+        rates["crime_rate"] = (rates["crime_rate"] * 100).round(2)
+        rates["crime_category_lower"] = rates["crime_category"].str.lower()
+        return rates.sort_values([rates.columns[0], "crime_category"], kind="stable")
 
     def __init__(self, geolevel: GeoLevel, time_filter: TimeFilter):
         self.geolevel = geolevel
         self.time_filter = time_filter
-        self.csv = pd.read_csv(self._path())
-        if geolevel == GeoLevel.BEAT:
-            self.csv["beat"] = self.csv["beat"].apply(lambda x: str(x).zfill(4))
-        self.csv["crime_rate"] = (self.csv["crime_rate"] * 100).round(2)
+        # Shared by the workers, see store
+        self.csv = shared_csv(self.path(geolevel, time_filter), self.prepare)
         self.max_crime_rate = (
             self.csv.groupby("crime_category")["crime_rate"].max().to_dict()
         )
-        self.csv["crime_category_lower"] = self.csv["crime_category"].str.lower()
 
+        # Figure arrays of the whole table, built once
+        arrays = (
+            self.csv[geolevel.value].to_numpy(),
+            self.csv["crime_rate"].to_numpy(),
+            self.csv[
+                [
+                    "neighborhood",
+                    "specific_count",
+                    "total_count",
+                    "crime_category_lower",
+                    time_filter.value,
+                ]
+            ].to_numpy(),
+        )
+        self.empty = tuple(array[:0] for array in arrays)
+
+        # Views of the arrays on the rows of each time value and category
+        self.slices = {
+            key: tuple(array[positions[0] : positions[-1] + 1] for array in arrays)
+            for key, positions in self.csv.groupby(
+                [time_filter.value, "crime_category"], sort=False
+            ).indices.items()
+        }
+
+    def get_slice(self, time_value, crime_category):
+        """
+        Figure arrays of a time value and crime category.
+
+        Args:
+            time_value: The time value.
+            crime_category: The crime category.
+        Returns:
+            The locations, z and customdata arrays, empty if no crime.
+        """
+        return self.slices.get((time_value, crime_category), self.empty)
+
+
+@lazy_data
+def load_aggregations():
+    # The aggregations missing from the data folder are left out, only
+    # their own figures failing
+    return {
+        (geolevel, time_filter): DataAggregation(geolevel, time_filter)
+        for geolevel in GeoLevel
+        for time_filter in TimeFilter
+        if os.path.exists(DataAggregation.path(geolevel, time_filter))
+    }
+
+
+# Resolution of the boundaries drawn for each geolevel, "full" or one of
+# the simplified ones written by the preprocessing ("high", "medium", "low")
+BOUNDARY_RESOLUTIONS = {
+    GeoLevel.DISTRICT: "medium",
+    GeoLevel.BEAT: "high",
+}
+
+# Route of the boundaries, fetched once by the browser from the URL of the
+# figures instead of being sent within every figure
+BOUNDARIES_ROUTE = "boundaries"
+
+# Lifetime of the boundaries in the browser cache, in seconds: their URL
+# changes with their content
+BOUNDARIES_MAX_AGE = 365 * 24 * 60 * 60
 
-AGGREGATIONS = {
-    (geolevel, time_filter): DataAggregation(geolevel, time_filter)
+
+def file_version(path):
+    """
+    Version of a file, changing with its content.
+
+    Args:
+        path: The file.
+    Returns:
+        The first hexadecimal digits of its hash.
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+BOUNDARY_PATHS = {
+    geolevel: geolevel.boundaries_path(BOUNDARY_RESOLUTIONS[geolevel])
     for geolevel in GeoLevel
-    for time_filter in TimeFilter
 }
 
+BOUNDARY_VERSIONS = {
+    geolevel: file_version(path) for geolevel, path in BOUNDARY_PATHS.items()
+}
 
-GEOJSONS = {geolevel: GeoLevel(geolevel).read_boundaries() for geolevel in GeoLevel}
+# URLs of the boundaries under the path prefix of the app, set with the
+# route by get_callbacks
+BOUNDARY_URLS = {}
 
 HOURS = list(range(24))
 
@@ -119,14 +222,15 @@ MONTHS = [
     "December",
 ]
 
-# Extract unique years, months, days, hours, and crime categories
-YEARS = sorted(
-    AGGREGATIONS[(GeoLevel.DISTRICT, TimeFilter.YEARLY)].csv["year"].unique()
+# Extract unique years and crime categories, without loading the aggregations
+YEARS_CRIMES = pd.read_csv(
+    DataAggregation.path(GeoLevel.DISTRICT, TimeFilter.YEARLY),
+    usecols=["year", "crime_category"],
 )
 
-CRIMES = sorted(
-    AGGREGATIONS[(GeoLevel.DISTRICT, TimeFilter.YEARLY)].csv["crime_category"].unique()
-)
+YEARS = sorted(YEARS_CRIMES["year"].unique())
+
+CRIMES = sorted(YEARS_CRIMES["crime_category"].unique())
 
 
 def convert_to_12_hour(hour):
@@ -152,6 +256,7 @@ time_filter_values = {
 }
 
 
+@cached_figure
 def create_choropleth(crime_category, selected_time_idx, time_filter_str, geolevel_str):
     """
     Create a choropleth map.
@@ -168,13 +273,12 @@ def create_choropleth(crime_category, selected_time_idx, time_filter_str, geolev
     time_filter = TimeFilter.from_str(time_filter_str)
     geolevel = GeoLevel.from_str(geolevel_str)
     time_value = time_filter_values[time_filter][selected_time_idx]
-    aggregation = AGGREGATIONS[(geolevel, time_filter)]
-    filtered_data = aggregation.csv[
-        (aggregation.csv[time_filter.value] == time_value)
-        & (aggregation.csv["crime_category"] == crime_category)
-    ]
+    aggregation = load_aggregations()[(geolevel, time_filter)]
+    locations, crime_rates, custom_data = aggregation.get_slice(
+        time_value, crime_category
+    )
     max_crime_rate = aggregation.max_crime_rate[crime_category]
-    geojson = GEOJSONS[geolevel]
+    geojson = BOUNDARY_URLS[geolevel]
     feature_id = (
         "properties.dist_num"
         if geolevel == GeoLevel.DISTRICT
@@ -196,21 +300,11 @@ def create_choropleth(crime_category, selected_time_idx, time_filter_str, geolev
         + "<extra></extra>"
     )
 
-    custom_data = filtered_data[
-        [
-            "neighborhood",
-            "specific_count",
-            "total_count",
-            "crime_category_lower",
-            time_filter.value,
-        ]
-    ].values
-
     fig = go.Figure(
         go.Choropleth(
             geojson=geojson,
-            locations=filtered_data[geolevel.value],
-            z=filtered_data["crime_rate"],
+            locations=locations,
+            z=crime_rates,
             featureidkey=feature_id,
             colorscale="Plasma",
             zmin=0,
@@ -349,7 +443,47 @@ SCALES_MARKS = {
 }
 
 
+def serve_boundaries(version, name):
+    """
+    Boundaries of a geolevel, cacheable for good.
+
+    Args:
+        version: The version of the boundaries in their URL.
+        name: The geolevel.
+    Returns:
+        The GeoJSON response, or a 404 error for an unknown geolevel or
+        an outdated version.
+    """
+    geolevel = next((g for g in GeoLevel if g.value == name), None)
+    if geolevel is None or version != BOUNDARY_VERSIONS[geolevel]:
+        flask.abort(404)
+
+    response = flask.send_file(
+        os.path.abspath(BOUNDARY_PATHS[geolevel]),
+        mimetype="application/geo+json",
+        etag=version,
+        max_age=BOUNDARIES_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 def get_callbacks(app):
+    app.server.add_url_rule(
+        f"{app.config.routes_pathname_prefix}{BOUNDARIES_ROUTE}/<version>/<name>.geojson",
+        "map_boundaries",
+        serve_boundaries,
+    )
+    BOUNDARY_URLS.update(
+        {
+            geolevel: app.get_relative_path(
+                f"/{BOUNDARIES_ROUTE}/{version}/{geolevel.value}.geojson"
+            )
+            for geolevel, version in BOUNDARY_VERSIONS.items()
+        }
+    )
+
     @app.callback(
         Output("choropleth", "figure"),
         [
@@ -362,9 +496,18 @@ def get_callbacks(app):
     def update_map_callback(
         crime_category, selected_time_idx, time_filter_str, geolevel_str
     ):
-        return create_choropleth(
+        figure = create_choropleth(
             crime_category, selected_time_idx, time_filter_str, geolevel_str
         )
+        # The boundaries only change with the geolevel, otherwise only the
+        # values of the locations are sent
+        if "geo-level-dropdown.value" in dash.callback_context.triggered_prop_ids:
+            return figure
+        return figure_patch(
+            figure,
+            data=["locations", "z", "customdata", "zmax", "hovertemplate"],
+            layout=["title"],
+        )
 
     @app.callback(
         [
@@ -3,13 +3,20 @@ Multiline chart visualization.
 """
 
 import numpy as np
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
 
 from paths import DATA_MULTILINE_FOLDER
+from store import shared_csv
+from viz.cache import cached_figure
+from viz.registry import lazy_data
+
+
+@lazy_data
+def load_counts():
+    return shared_csv(DATA_MULTILINE_FOLDER + "/multiline.csv")
 
 
 def get_hover_template(mode):
@@ -25,7 +32,7 @@ def get_hover_template(mode):
         return "<b>%{customdata[1]}</b><br>%{y} crimes in %{x}<extra></extra>"
 
 
-def get_figure(data):
+def get_figure(_data):
     """
     Returns a plotly figure object
 
@@ -34,7 +41,12 @@ def get_figure(data):
     Returns:
         The figure to be displayed.
     """
-    data = pd.read_csv(DATA_MULTILINE_FOLDER + "/multiline.csv")
+    return create_figure()
+
+
+@cached_figure
+def create_figure():
+    data = load_counts()
 
     # Add traces for Annual
     fig = px.line(
@@ -45,7 +57,7 @@ def get_figure(data):
         title="Number of crimes per year",
         color_discrete_sequence=px.colors.qualitative.Light24,
     )
-    fig.update_traces(hovertemplate=get_hover_template("Annual"))
+    fig.update_traces(hovertemplate=get_hover_template("Annual"), meta="Annual")
     for trace in fig.data:
         trace.customdata = np.stack(
             [np.full(len(trace.y), "Annual"), np.full(len(trace.y), trace.name)],
@@ -68,7 +80,8 @@ def get_figure(data):
                 hovertemplate=get_hover_template("Cumulative"),
                 customdata=customdata,
                 legendgroup=primary_type,
-                line=dict(color=px.colors.qualitative.Light24[i])
+                line=dict(color=px.colors.qualitative.Light24[i]),
+                meta="Cumulative",
             )
         )
 
@@ -84,13 +97,12 @@ def get_figure(data):
         yaxis=dict(fixedrange=True),
     )
 
-    # Get the maximum value for the shapes
-    max_annual, max_cumulative = 0, 0
-    for trace in fig.data:
-        if trace.customdata[0][0] == "Annual":
-            max_annual = max(max_annual, trace.y.all())
-        else:
-            max_cumulative = max(max_cumulative, trace.y.all())
+    # Get the maximum value of each display mode for the shapes
+    max_annual = int(data["Annual"].max())
+    max_cumulative = int(data["Cumulative"].max())
+    fig.update_layout(
+        meta={"max_y": {"Annual": max_annual, "Cumulative": max_cumulative}}
+    )
 
     # 2008 crisis
     crisis_shape = dict(
@@ -216,44 +228,14 @@ def get_html(figure):
 
 
 def get_callbacks(app):
-    @app.callback(
+    # The traces, shapes and annotations visibility is updated in the browser
+    # (assets/multiline.js), without sending the figure to the server
+    app.clientside_callback(
+        ClientsideFunction(namespace="multiline", function_name="update_mode"),
         Output("multiline-graph", "figure"),
         [
-            Input("multiline-graph", "figure"),
             Input("multiline-mode", "value"),
             Input("multiline-checklist", "value"),
         ],
+        [State("multiline-graph", "figure")],
     )
-    def multiline_update_mode_callback(multiline_graph, display_mode, checklist_values):
-        max_y = 0
-        # Update the traces visibility
-        for trace in multiline_graph["data"]:
-            if trace.get("customdata")[0][0] == display_mode:
-                max_y = max(max_y, max(trace["y"]))
-                trace["visible"] = True
-            else:
-                trace["visible"] = False
-
-        # Update the 2008 crisis shape and annotation
-        if "2008" in checklist_values:
-            multiline_graph["layout"]["shapes"][0]["visible"] = True
-            multiline_graph["layout"]["annotations"][0]["visible"] = True
-        else:
-            multiline_graph["layout"]["shapes"][0]["visible"] = False
-            multiline_graph["layout"]["annotations"][0]["visible"] = False
-
-        # Update the covid crisis shape
-        if "covid" in checklist_values:
-            multiline_graph["layout"]["shapes"][1]["visible"] = True
-            multiline_graph["layout"]["annotations"][1]["visible"] = True
-        else:
-            multiline_graph["layout"]["shapes"][1]["visible"] = False
-            multiline_graph["layout"]["annotations"][1]["visible"] = False
-
-        # Update the max y value
-        multiline_graph["layout"]["shapes"][0]["y1"] = max_y
-        multiline_graph["layout"]["annotations"][0]["y"] = max_y
-        multiline_graph["layout"]["shapes"][1]["y1"] = max_y
-        multiline_graph["layout"]["annotations"][1]["y"] = max_y
-
-        return multiline_graph
@@ -0,0 +1,46 @@
+"""
+Partial updates of the figures of the visualizations.
+
+When the inputs of a callback only change some arrays or titles of its
+figure, the callback returns a Patch of these keys instead of the whole
+figure, so that the layout, template and unchanged traces are neither
+serialized nor sent to the browser again.
+"""
+
+from dash import Patch
+
+
+def get_key(obj, key):
+    for part in key.split("."):
+        obj = obj.get(part) if obj is not None else None
+    return obj
+
+
+def set_key(patch, key, value):
+    *parents, last = key.split(".")
+    for part in parents:
+        patch = patch[part]
+    patch[last] = value
+
+
+def figure_patch(figure, data=(), layout=()):
+    """
+    Patch replacing some keys of the traces and layout of a figure.
+
+    Args:
+        figure: The new figure, as a JSON-compatible dict, with the same
+            number of traces as the figure in the browser.
+        data: The keys of the traces to replace, dotted for nested keys
+            (e.g. "marker.color").
+        layout: The keys of the layout to replace, dotted for nested keys
+            (e.g. "xaxis.title").
+    Returns:
+        The Patch of the "figure" property.
+    """
+    patch = Patch()
+    for i, trace in enumerate(figure["data"]):
+        for key in data:
+            set_key(patch["data"][i], key, get_key(trace, key))
+    for key in layout:
+        set_key(patch["layout"], key, get_key(figure["layout"], key))
+    return patch
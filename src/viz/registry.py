@@ -0,0 +1,120 @@
+"""
+Registry of the data of the visualizations.
+
+The visualizations declare the data they read as loaders instead of
+reading it at import, so that the app starts without waiting for it.
+The data is loaded on first use, or beforehand by a background warm-up
+thread started with the app, and then kept in memory.
+"""
+
+import logging
+import threading
+import time
+from functools import update_wrapper
+
+logger = logging.getLogger(__name__)
+
+# Loaders of the data, in order of declaration
+LOADERS = []
+
+
+class LazyData:
+    """
+    Data loaded once, on first use, by any of the threads using it.
+    """
+
+    def __init__(self, load):
+        """
+        Args:
+            load: The function called without arguments to load the data.
+        """
+        self.load = load
+        self.name = f"{load.__module__}.{load.__qualname__}"
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.value = None
+        update_wrapper(self, load)
+
+    def __call__(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    start = time.perf_counter()
+                    self.value = self.load()
+                    self.loaded = True
+                    logger.info(
+                        "Loaded %s in %.2fs", self.name, time.perf_counter() - start
+                    )
+        return self.value
+
+    def reset(self):
+        """
+        Load the data again on next use. The previous data is still
+        returned until then.
+        """
+        with self.lock:
+            self.loaded = False
+
+
+def lazy_data(load):
+    """
+    Decorator declaring a loader of the data of a visualization.
+
+    Args:
+        load: The function loading the data, without arguments.
+    Returns:
+        The LazyData, called to get the data.
+    """
+    data = LazyData(load)
+    LOADERS.append(data)
+    return data
+
+
+def is_loaded(module=None):
+    """
+    Whether the data of some loaders is loaded.
+
+    Args:
+        module: The name of the module declaring the loaders, all the
+            loaders if None.
+    Returns:
+        True if all of them are loaded.
+    """
+    return all(
+        data.loaded
+        for data in LOADERS
+        if module is None or data.load.__module__ == module
+    )
+
+
+def load_all():
+    """
+    Load the data of all the declared loaders, logging the failures so
+    that they are raised again on first use.
+    """
+    for data in LOADERS:
+        try:
+            data()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to load %s", data.name)
+
+
+def reset_all():
+    """
+    Load the data of all the declared loaders again on next use,
+    reading the tables of the store again if their files changed.
+    """
+    for data in LOADERS:
+        data.reset()
+
+
+def warm_up():
+    """
+    Load the data of all the declared loaders in a background thread.
+
+    Returns:
+        The started thread.
+    """
+    thread = threading.Thread(target=load_all, name="viz-warm-up", daemon=True)
+    thread.start()
+    return thread
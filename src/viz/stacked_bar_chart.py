@@ -1,39 +1,43 @@
 "stacked_bar_chart.py"
 
-import pandas as pd
 import plotly.graph_objects as go
-
-from paths import DATA_STACKEDBC_FOLDER
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
+from paths import DATA_STACKEDBC_FOLDER
+from store import shared_csv
+from viz.cache import cached_figure
+from viz.patch import figure_patch
+from viz.registry import lazy_data
+
 ## LE TEMPLATE DE FICHIER A UTILISER POUR LES VISUALISATIONS
 ## Chaque fichier de visualisation doit contenir la fonction get_figure(data) qui retourne un objet figure de plotly
 ## Le nom du fichier est : "nom_de_la_visualisation.py"
 
 
-# Import data
-beat_count = pd.read_csv(DATA_STACKEDBC_FOLDER + "/beat_count.csv")
-district_count = pd.read_csv(DATA_STACKEDBC_FOLDER + "/district_count.csv")
-type_count = pd.read_csv(DATA_STACKEDBC_FOLDER + "/type_count.csv")
+@lazy_data
+def load_counts():
+    # Import data
+    beat_count = shared_csv(DATA_STACKEDBC_FOLDER + "/beat_count.csv")
+    district_count = shared_csv(DATA_STACKEDBC_FOLDER + "/district_count.csv")
+    type_count = shared_csv(DATA_STACKEDBC_FOLDER + "/type_count.csv")
 
+    # J'ai aussi besoin d'une façon de choisir entre les 3 data sets (beat/district/type) 
 
-# J'ai aussi besoin d'une façon de choisir entre les 3 data sets (beat/district/type) 
+    #find a way to split data set in 2
 
-#find a way to split data set in 2
+    district_true = district_count[district_count['Arrest']].sort_values(by='arrest_rate_district', ascending=False)
+    district_false = district_count[district_count['Arrest'] == False].sort_values(by='arrest_rate_district', ascending=False)
 
-district_true = district_count[district_count['Arrest']].sort_values(by='arrest_rate_district', ascending=False)
-district_false = district_count[district_count['Arrest'] == False].sort_values(by='arrest_rate_district', ascending=False)
+    beat_true = beat_count[beat_count['Arrest']].sort_values(by='arrest_rate_beat', ascending=False)
+    beat_false = beat_count[beat_count['Arrest'] == False].sort_values(by='arrest_rate_beat', ascending=False)
 
-beat_true = beat_count[beat_count['Arrest']].sort_values(by='arrest_rate_beat', ascending=False)
-beat_false = beat_count[beat_count['Arrest'] == False].sort_values(by='arrest_rate_beat', ascending=False)
+    type_true = type_count[type_count['Arrest']].sort_values(by='arrest_rate_type', ascending=False)
+    type_false = type_count[type_count['Arrest'] == False].sort_values(by='arrest_rate_type', ascending=False)
 
-type_true = type_count[type_count['Arrest']].sort_values(by='arrest_rate_type', ascending=False)
-type_false = type_count[type_count['Arrest'] == False].sort_values(by='arrest_rate_type', ascending=False)
-
-all_data = {"district": {"x" : [district_false["arrest_rate_district"], district_true["arrest_rate_district"]], "y" : [district_false['District'].apply(lambda x : str(int(x))), district_true['District'].apply(lambda x : str(int(x)))]},
-        "beat": {"x" : [beat_false["arrest_rate_beat"], beat_true["arrest_rate_beat"]], "y" : [beat_false['Beat'].apply(lambda x : str(x)), beat_true['Beat'].apply(lambda x : str(x))]},
-        "type": {"x" : [type_false["arrest_rate_type"], type_true["arrest_rate_type"]], "y" : [type_false['Primary.Type'], type_true['Primary.Type']]}}
+    return {"district": {"x" : [district_false["arrest_rate_district"], district_true["arrest_rate_district"]], "y" : [district_false['District'].apply(lambda x : str(int(x))), district_true['District'].apply(lambda x : str(int(x)))]},
+            "beat": {"x" : [beat_false["arrest_rate_beat"], beat_true["arrest_rate_beat"]], "y" : [beat_false['Beat'].apply(lambda x : str(x)), beat_true['Beat'].apply(lambda x : str(x))]},
+            "type": {"x" : [type_false["arrest_rate_type"], type_true["arrest_rate_type"]], "y" : [type_false['Primary.Type'], type_true['Primary.Type']]}}
 
 
 # transform district into string
@@ -42,7 +46,10 @@ all_data = {"district": {"x" : [district_false["arrest_rate_district"], district
 
 #creation viz
 
+@cached_figure
 def create_stacked_bar(mode="district"):
+    all_data = load_counts()
+
     # Create the figure
     fig = go.Figure()
 
@@ -151,10 +158,11 @@ def get_callbacks(app):
     
     @app.callback(
         Output("stacked_bar_chart", "figure"),
-        [
-            Input("stacked-bar-chart-dropdown", "value"),
-            Input("stacked_bar_chart", "figure"),
-        ],
+        [Input("stacked-bar-chart-dropdown", "value")],
     )
-    def stacked_bar_chart_callback(value, figure):
-        return create_stacked_bar(value)
+    def stacked_bar_chart_callback(value):
+        return figure_patch(
+            create_stacked_bar(value),
+            data=["x", "y", "name", "hovertemplate"],
+            layout=["title", "yaxis.title"],
+        )
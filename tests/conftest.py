@@ -0,0 +1,17 @@
+"""
+Run the tests from the src folder, as the app and the preprocessing.
+"""
+
+import os
+import sys
+
+import pytest
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+sys.path.insert(0, SRC_FOLDER)
+
+
+@pytest.fixture(autouse=True)
+def in_src_folder(monkeypatch):
+    monkeypatch.chdir(SRC_FOLDER)
@@ -0,0 +1,53 @@
+"""
+Tests of the cache of the figures.
+"""
+
+import os
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from viz import cache, registry
+
+
+def test_new_build_reloads_data(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}", encoding="utf-8")
+    monkeypatch.setattr(cache, "BUILD_PATHS", [str(manifest)])
+    monkeypatch.setattr(registry, "LOADERS", [])
+    loads = []
+    data = registry.lazy_data(lambda: loads.append(None) or len(loads))
+    figures = cache.FigureCache()
+
+    assert data() == 1
+    figures.entries["key"] = b"{}"
+    assert figures.get("key") == {}
+
+    os.utime(manifest, ns=(0, 0))
+    assert figures.get("key") is None
+    assert data() == 2
+
+
+def test_least_recently_used_evicted():
+    figure = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))
+    size = len(pio.to_json(figure, validate=False))
+    figures = cache.FigureCache(max_bytes=int(size * 2.5))
+
+    figures.put("a", figure)
+    figures.put("b", figure)
+    assert figures.get("a") is not None
+    figures.put("c", figure)
+
+    assert figures.get("b") is None
+    assert figures.get("a") is not None
+    assert figures.get("c") is not None
+    assert figures.bytes == 2 * size
+
+
+def test_oversized_figure_not_cached():
+    figure = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))
+    figures = cache.FigureCache(max_bytes=10)
+
+    assert figures.put("a", figure)["data"][0]["type"] == "bar"
+    assert figures.get("a") is None
+    assert figures.bytes == 0
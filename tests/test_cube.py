@@ -0,0 +1,45 @@
+"""
+Tests of the dense count cubes.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import CountCube
+
+
+def cube():
+    counts = pd.DataFrame(
+        {
+            "year": [2021, 2020, 2020, 2021],
+            "type": ["THEFT", "ARSON", "THEFT", "BATTERY"],
+            "count": [4, 1, 2, 3],
+        }
+    )
+    return CountCube.from_counts(counts, ["year", "type"])
+
+
+def test_from_counts():
+    counts = cube()
+    assert counts.labels[0].tolist() == [2020, 2021]
+    assert counts.labels[1].tolist() == ["ARSON", "BATTERY", "THEFT"]
+    assert counts.values.tolist() == [[1, 0, 2], [0, 3, 4]]
+
+
+def test_fold():
+    folded = cube().fold("type", ["THEFT"], "OTHER")
+    assert folded.labels[1].tolist() == ["OTHER", "THEFT"]
+    assert folded.values.tolist() == [[1, 2], [3, 4]]
+    np.testing.assert_array_equal(folded.total("year"), cube().total("year"))
+
+
+def test_fold_into_kept_label():
+    folded = cube().fold("type", ["ARSON", "THEFT"], "THEFT")
+    assert folded.labels[1].tolist() == ["ARSON", "THEFT"]
+    assert folded.values.tolist() == [[1, 2], [0, 7]]
+
+
+def test_cumsum():
+    cumulated = cube().cumsum("year")
+    assert cumulated.values.tolist() == [[1, 0, 2], [1, 3, 6]]
+    assert cumulated.to_frame().query("year == 2021")["count"].tolist() == [1, 3, 6]
@@ -0,0 +1,58 @@
+"""
+Tests of the single-pass aggregation engine.
+"""
+
+import pandas as pd
+
+import engine
+import paths
+
+
+def aggregate():
+    return engine.Aggregate("test", "test", ["year", "type"], finalize=None)
+
+
+def counts(years, types, values):
+    return pd.DataFrame({"year": years, "type": types, "count": values})
+
+
+def test_apply_delta():
+    updated = engine.apply_delta(
+        aggregate(),
+        counts([2020, 2020], ["THEFT", "ARSON"], [3, 1]),
+        counts([2020, 2021], ["THEFT", "THEFT"], [1, 2]),
+        counts([2020], ["ARSON"], [1]),
+    )
+    # The emptied group is dropped
+    assert updated.to_dict("list") == {
+        "year": [2020, 2021],
+        "type": ["THEFT", "THEFT"],
+        "count": [4, 2],
+    }
+
+
+def test_apply_delta_missing_keys():
+    kept = engine.Aggregate("test", "test", ["year", "type"], None, dropna=False)
+    updated = engine.apply_delta(
+        kept,
+        counts([2020, 2020], ["THEFT", None], [3, 2]),
+        counts([2020], [None], [1]),
+        counts([], [], []),
+    )
+    assert updated["count"].tolist() == [3, 3]
+    assert updated["type"].isna().tolist() == [False, True]
+
+
+def test_state_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(paths, "DATA_STATE_FOLDER", str(tmp_path))
+    state = counts([2020, 2021], ["THEFT", "ARSON"], [3, 1]).astype(
+        {"type": "category"}
+    )
+    engine.save_state(aggregate(), state)
+
+    loaded = engine.load_state(aggregate())
+    assert loaded.to_dict("list") == {
+        "year": [2020, 2021],
+        "type": ["THEFT", "ARSON"],
+        "count": [3, 1],
+    }
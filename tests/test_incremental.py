@@ -0,0 +1,18 @@
+"""
+Tests of the incremental refresh of the aggregates.
+"""
+
+import pytest
+
+import incremental
+
+
+@pytest.mark.parametrize("content", ["", "ID,Updated On,Date\n"])
+def test_refresh_empty_delta(tmp_path, monkeypatch, content):
+    watermark = tmp_path / "watermark"
+    watermark.write_text("2023-01-01T00:00:00", encoding="utf-8")
+    monkeypatch.setattr(incremental, "WATERMARK_PATH", str(watermark))
+    delta = tmp_path / "delta.csv"
+    delta.write_text(content, encoding="utf-8")
+
+    assert incremental.refresh(str(delta), ["Date"], None) == 0
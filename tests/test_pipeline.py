@@ -0,0 +1,59 @@
+"""
+Tests of the dependency-tracked preprocessing stages.
+"""
+
+import pytest
+
+import pipeline
+
+
+def copy_stage(name, source, target):
+    def run():
+        target.write_text(source.read_text(encoding="utf-8"), encoding="utf-8")
+
+    return pipeline.Stage(
+        name, run, inputs=[str(source)], outputs=[str(target)], code=[copy_stage]
+    )
+
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    (tmp_path / "raw.csv").write_text("raw", encoding="utf-8")
+    (tmp_path / "other.csv").write_text("other", encoding="utf-8")
+    return [
+        copy_stage("viz", tmp_path / "clean.csv", tmp_path / "viz.csv"),
+        copy_stage("clean", tmp_path / "raw.csv", tmp_path / "clean.csv"),
+        copy_stage("other", tmp_path / "other.csv", tmp_path / "other_viz.csv"),
+    ]
+
+
+def test_run_in_dependency_order(stages):
+    executed = pipeline.run(stages)
+    assert sorted(executed) == ["clean", "other", "viz"]
+    assert executed.index("clean") < executed.index("viz")
+
+
+def test_fresh_stages_are_skipped(stages):
+    pipeline.run(stages)
+    assert not pipeline.run(stages)
+    assert sorted(pipeline.run(stages, force=True)) == ["clean", "other", "viz"]
+
+
+def test_changed_input_runs_downstream(stages, tmp_path):
+    pipeline.run(stages)
+    (tmp_path / "raw.csv").write_text("new raw", encoding="utf-8")
+    assert pipeline.run(stages) == ["clean", "viz"]
+    assert (tmp_path / "viz.csv").read_text(encoding="utf-8") == "new raw"
+
+
+def test_deleted_output_runs_stage(stages, tmp_path):
+    pipeline.run(stages)
+    (tmp_path / "other_viz.csv").unlink()
+    assert pipeline.run(stages) == ["other"]
+
+
+def test_targets_select_upstream(stages):
+    assert pipeline.run(stages, targets=["viz"]) == ["clean", "viz"]
+    with pytest.raises(ValueError):
+        pipeline.run(stages, targets=["unknown"])
@@ -0,0 +1,57 @@
+"""
+Tests of the preparation of the crimes for the aggregates.
+"""
+
+import numpy as np
+import pandas as pd
+
+import ingest
+import preprocess
+
+
+def crimes(latitudes, longitudes):
+    return pd.DataFrame(
+        {
+            "Beat": [1111, 1234, 2533][: len(latitudes)],
+            "Latitude": latitudes,
+            "Longitude": longitudes,
+            "Primary Type": ["THEFT", "BATTERY", "THEFT"][: len(latitudes)],
+        }
+    )
+
+
+def test_prepare_map_chunk_all_located():
+    # No district to fill from the beat
+    chunk = preprocess.prepare_map_chunk(crimes([41.88, 41.76], [-87.63, -87.62]))
+    assert chunk["district"].tolist() == ["1", "3"]
+
+
+def test_prepare_map_chunk_fills_unlocated():
+    chunk = preprocess.prepare_map_chunk(
+        crimes([41.88, 41.76, np.nan], [-87.63, -87.62, np.nan])
+    )
+    assert chunk["beat"].tolist()[2] == "2533"
+    assert chunk["district"].tolist() == ["1", "3", "25"]
+
+
+def test_crime_rates_total_counts_unlocated():
+    # The neighborhood of the second crime is unknown, as the category of the third
+    crimes = pd.DataFrame(
+        {
+            "year": [2020, 2020, 2020],
+            "district": ["1", "1", "1"],
+            "neighborhood": ["Loop", np.nan, "Loop"],
+            "crime_category": ["Theft", "Theft", np.nan],
+        }
+    )
+    counter = ingest.GroupCounter(
+        ["year", "district", "neighborhood", "crime_category"], dropna=False
+    )
+    counter.update(crimes)
+    rates = preprocess.calculate_crime_rates(counter.result(), "year", "district")
+    rates = rates.set_index("crime_category")
+
+    assert rates.loc["Theft", "specific_count"] == 1
+    assert rates.loc["Theft", "total_count"] == 2
+    assert rates.loc["All Crimes", "specific_count"] == 2
+    assert rates.loc["All Crimes", "total_count"] == 3
@@ -0,0 +1,60 @@
+"""
+Tests of the one-pass sampling of the crimes.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sampling import ReservoirSampler
+
+
+def chunks(strata, size=10):
+    rows = pd.DataFrame({"stratum": strata, "value": np.arange(len(strata))})
+    return [rows.iloc[start : start + size] for start in range(0, len(rows), size)]
+
+
+def sample(sampler, strata):
+    if sampler.strata:
+        for chunk in chunks(strata):
+            sampler.count(chunk)
+    for chunk in chunks(strata):
+        sampler.update(chunk)
+        # Only the allocated rows of each stratum are kept
+        assert len(sampler.sample) <= sampler.size
+    return sampler.result()
+
+
+def test_simple_sample():
+    result = sample(ReservoirSampler(7, seed=0), ["a"] * 50)
+    assert len(result) == 7
+    assert result["value"].is_monotonic_increasing
+    assert result["value"].is_unique
+
+
+def test_smaller_dataset_is_kept():
+    result = sample(ReservoirSampler(100, ["stratum"], seed=0), ["a", "b"] * 5)
+    assert result["value"].tolist() == list(range(10))
+
+
+def test_largest_remainder_allocation():
+    sampler = ReservoirSampler(10, ["stratum"], seed=0)
+    # Quotas of 5.5, 3.5 and 1
+    result = sample(sampler, ["a"] * 55 + ["b"] * 35 + ["c"] * 10)
+    allocation = sampler.allocation()
+    assert allocation.sum() == 10
+    assert allocation.to_dict() == {("a",): 6, ("b",): 3, ("c",): 1}
+    assert result["stratum"].value_counts().to_dict() == {"a": 6, "b": 3, "c": 1}
+
+
+def test_same_seed_same_sample():
+    strata = ["a", "b", "c"] * 30
+    first = sample(ReservoirSampler(9, ["stratum"], seed=1), strata)
+    second = sample(ReservoirSampler(9, ["stratum"], seed=1), strata)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_strata_counted_first():
+    sampler = ReservoirSampler(5, ["stratum"], seed=0)
+    with pytest.raises(ValueError):
+        sampler.update(chunks(["a", "b"])[0])
@@ -0,0 +1,38 @@
+"""
+Tests of the location of the crimes in the beats.
+"""
+
+import json
+
+import numpy as np
+
+from spatial import BeatIndex
+
+
+def square(x, y, beat, district):
+    return {
+        "type": "Feature",
+        "properties": {"beat_num": beat, "district": district},
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]],
+        },
+    }
+
+
+def test_locate(tmp_path):
+    path = tmp_path / "beats.geojson"
+    path.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [square(0, 0, "0111", "01"), square(1, 0, "0112", "01")],
+            }
+        ),
+        encoding="utf-8",
+    )
+    index = BeatIndex.from_geojson(str(path))
+
+    beats, districts = index.locate([0.5, 1.5, 5.0, np.nan], [0.5, 0.5, 5.0, np.nan])
+    assert beats.tolist() == ["111", "112", None, None]
+    np.testing.assert_array_equal(districts, [1, 1, np.nan, np.nan])